@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Littlemon.settings')
+# Under ASGI the menu, cart and order reads are served by native async views
+os.environ.setdefault('LITTLEMON_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Automatic delivery crew assignment, when ORDER_ASSIGNMENT_INTERVAL is set (POSIX only)
+from LittlemonAPI.assignment import start_worker  # noqa: E402
+
+start_worker()
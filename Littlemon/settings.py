@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittlemonAPI.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +59,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'LittlemonAPI.middleware.ProfilerMiddleware',
+    'LittlemonAPI.middleware.TrafficRecorderMiddleware',
 ]
 
 ROOT_URLCONF = 'Littlemon.urls'
@@ -81,11 +86,47 @@ WSGI_APPLICATION = 'Littlemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Every connection is tuned for concurrent use (WAL, busy timeout...) in
+# LittlemonAPI/db.py, which also routes the reads of the read-only views to 'replica'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Persistent connections, checked before being reused
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Transactions take the write lock at BEGIN and wait for it (busy_timeout)
+            # instead of failing with "database is locked" when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Second, read-only connection to the same file
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'READ_ONLY': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['LittlemonAPI.db.ReadReplicaRouter']
+
+
+# Caches
+# 'shared' is file based so every worker process on the host sees the same entries
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'littlemon-cache',
+    },
 }
 
 
@@ -137,15 +178,19 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittlemonAPI.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'LittlemonAPI.throttling.SharedUserRateThrottle',
+        'LittlemonAPI.throttling.SharedAnonRateThrottle',
+        'LittlemonAPI.throttling.SharedScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '10/min',   # 100 requêtes par jour pour chaque utilisateur authentifié
         'anon': '20/day',    # 20 requêtes par jour pour chaque utilisateur non connecté
+        'menu': '60/min',   # lecture du menu (throttle_scope = 'menu')
+        'checkout': '5/min',   # passage de commande, POST /api/orders/
+        'order-feed': '60/min',   # flux des commandes, GET /api/orders/events
     },
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -155,3 +200,71 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 2,
 }
+
+
+# Menu catalog cache (see LittlemonAPI/menu_cache.py)
+MENU_CACHE_MAX_ENTRIES = 256
+
+# Role resolution cache (see LittlemonAPI/utils.py), in seconds
+ROLE_CACHE_TIMEOUT = 300
+
+# Token authentication cache (see LittlemonAPI/authentication.py)
+TOKEN_CACHE_MAX_ENTRIES = 1024
+TOKEN_CACHE_TTL = 60
+
+# Shared throttle counters (see LittlemonAPI/throttling.py)
+THROTTLE_DB_PATH = Path(tempfile.gettempdir()) / 'littlemon-throttle.sqlite3'
+
+# Idempotency-Key on POST /api/orders/ and POST /api/cart/menu-items/ (see LittlemonAPI/idempotency.py):
+# responses kept per process, for how long in seconds, and how long a retry waits for the first request
+IDEMPOTENCY_MAX_ENTRIES = 10_000
+IDEMPOTENCY_TTL = 24 * 3600
+IDEMPOTENCY_WAIT = 30
+
+# Request metrics (see LittlemonAPI/metrics.py), flushed per worker every few seconds
+METRICS_DIR = Path(tempfile.gettempdir()) / 'littlemon-metrics'
+METRICS_FLUSH_INTERVAL = 5.0
+
+# On-demand profiling (see LittlemonAPI/middleware.py): send "X-Profile: 1" as a manager,
+# or profile a random share of the requests
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_SAMPLE_RATE = 0.0
+PROFILER_DIR = Path(tempfile.gettempdir()) / 'littlemon-profiles'
+PROFILER_MAX_FILES = 50
+
+# Record the API traffic for manage.py bench_replay, e.g. BASE_DIR / 'traffic.jsonl' (off when None)
+TRAFFIC_RECORD_PATH = None
+
+# Serve the hot GET endpoints with the async views (see LittlemonAPI/async_views.py),
+# switched on by asgi.py
+ASYNC_READ_VIEWS = os.environ.get('LITTLEMON_ASYNC_VIEWS') == '1'
+
+# SQLite pragmas applied to every new connection (see LittlemonAPI/db.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # in KiB
+    'temp_store': 'MEMORY',
+}
+
+# Order change feed (see LittlemonAPI/order_feed.py): longest long-poll wait, how often
+# waiting clients check for new events, events per response, and for Server-Sent Events
+# the keep-alive interval and how long a stream lasts before the client reconnects
+ORDER_FEED_WAIT = 25
+ORDER_FEED_POLL_INTERVAL = 0.25
+ORDER_FEED_BATCH = 100
+ORDER_FEED_KEEPALIVE = 15
+ORDER_FEED_STREAM_SECONDS = 300
+
+# Automatic delivery crew assignment (see LittlemonAPI/assignment.py, manage.py assign_orders):
+# seconds between two runs in the server process (off when None) and orders per UPDATE
+ORDER_ASSIGNMENT_INTERVAL = None
+ORDER_ASSIGNMENT_BATCH = 500
+
+# Longest date range of GET /api/analytics/sales, in days
+ANALYTICS_MAX_DAYS = 366
+
+# manage.py archive_orders moves the delivered orders older than this many days to the archive
+ORDER_ARCHIVE_AFTER_DAYS = 90
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Littlemon.settings')
 
 application = get_wsgi_application()
+
+# Automatic delivery crew assignment, when ORDER_ASSIGNMENT_INTERVAL is set (POSIX only)
+from LittlemonAPI.assignment import start_worker  # noqa: E402
+
+start_worker()
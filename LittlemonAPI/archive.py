@@ -0,0 +1,61 @@
+"""
+Hot/cold split of the orders.
+
+archive_orders() moves the delivered orders older than a cutoff, with
+their items, from Order/OrderItem to ArchivedOrder/ArchivedOrderItem,
+keeping their ids. Each chunk is copied and deleted in one short
+transaction, so checkouts only ever wait for one chunk. The live tables
+then hold the orders still in progress plus the recent ones; GET
+/api/orders/<id> falls through to the archive and GET /api/orders/history
+lists it. Archiving doesn't change the sales rollups. An order export
+running at the same time can miss or repeat the orders being moved (see
+order_export.py).
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+
+def archive_chunk(before, chunk_size):
+    """
+    Archives up to `chunk_size` orders, oldest first; returns how many
+    """
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        ids = list(Order.objects.filter(status=True, date__lt=before)
+                   .order_by('date', 'id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(ArchivedOrder._meta.db_table)} '
+                f'(id, user_id, delivery_crew_id, status, total, date, archived) '
+                f'SELECT id, user_id, delivery_crew_id, status, total, date, %s '
+                f'FROM {qn(Order._meta.db_table)} WHERE id IN ({placeholders})',
+                [timezone.now(), *ids],
+            )
+            cursor.execute(
+                f'INSERT INTO {qn(ArchivedOrderItem._meta.db_table)} '
+                f'(order_id, menuitem_id, quantity, unit_price, price) '
+                f'SELECT order_id, menuitem_id, quantity, unit_price, price '
+                f'FROM {qn(OrderItem._meta.db_table)} WHERE order_id IN ({placeholders})',
+                ids,
+            )
+        # The items go with their orders (cascade)
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before, chunk_size=1000, on_chunk=None):
+    """
+    Archives the delivered orders dated before `before` and returns how many
+    were moved. on_chunk(count) is called after each chunk.
+    """
+    total = 0
+    while count := archive_chunk(before, chunk_size):
+        total += count
+        if on_chunk:
+            on_chunk(count)
+    return total
@@ -0,0 +1,163 @@
+"""
+Automatic delivery crew assignment.
+
+assign_pending_orders() hands the unassigned, undelivered orders to the
+members of the "Delivery Crew" group a batch at a time. Each order goes to
+the crew member with the fewest open orders (a heap keyed by open load)
+and the whole batch is written with a single UPDATE. It runs from
+manage.py assign_orders, or in the server process when
+ORDER_ASSIGNMENT_INTERVAL is set (see AssignmentWorker).
+"""
+import heapq
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Count, Value, When
+
+from .metrics import registry
+from .models import Order, OrderEvent
+from .order_feed import record_order_events
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no lock file, so no worker (manage.py assign_orders still works)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def crew_loads():
+    """
+    Returns a heap of (open orders, user id) for the active crew members
+    """
+    crew = list(User.objects.filter(groups__name='Delivery Crew', is_active=True).values_list('id', flat=True))
+    open_orders = dict(
+        Order.objects.filter(status=False, delivery_crew_id__in=crew)
+        .values('delivery_crew_id').annotate(count=Count('id')).values_list('delivery_crew_id', 'count')
+    )
+    heap = [(open_orders.get(pk, 0), pk) for pk in crew]
+    heapq.heapify(heap)
+    return heap
+
+
+def assign_batch(heap, batch_size):
+    """
+    Assigns up to `batch_size` pending orders, oldest first, and updates the
+    heap in place. Returns the number of orders assigned.
+    """
+    with transaction.atomic():
+        pending = list(
+            Order.objects.filter(status=False, delivery_crew__isnull=True)
+            .order_by('id').values_list('id', 'user_id')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        assignments = {}
+        orders_of = defaultdict(list)
+        for order_id, _ in pending:
+            load, crew_id = heap[0]
+            heapq.heapreplace(heap, (load + 1, crew_id))
+            assignments[order_id] = crew_id
+            orders_of[crew_id].append(order_id)
+
+        # One WHEN per crew member rather than per order keeps the CASE short
+        Order.objects.filter(id__in=assignments, delivery_crew__isnull=True).update(delivery_crew_id=Case(
+            *(When(id__in=order_ids, then=Value(crew_id)) for crew_id, order_ids in orders_of.items())
+        ))
+        record_order_events(
+            OrderEvent(order_id=order_id, kind=OrderEvent.ASSIGNED, user_id=user_id,
+                       delivery_crew_id=assignments[order_id], status=False)
+            for order_id, user_id in pending
+        )
+    registry.increment(('orders_auto_assigned_total',), len(pending))
+    return len(pending)
+
+
+def assign_pending_orders(batch_size=None, on_batch=None):
+    """
+    Assigns batches until no order is left pending and returns the number of
+    orders assigned. on_batch(count, seconds) is called after each batch.
+    """
+    batch_size = batch_size or getattr(settings, 'ORDER_ASSIGNMENT_BATCH', 500)
+    heap = crew_loads()
+    if not heap:
+        logger.warning("No active delivery crew, orders left unassigned")
+        return 0
+
+    total = 0
+    while True:
+        start = time.perf_counter()
+        count = assign_batch(heap, batch_size)
+        if not count:
+            return total
+        total += count
+        if on_batch:
+            on_batch(count, time.perf_counter() - start)
+        if count < batch_size:
+            return total
+
+
+class AssignmentWorker(threading.Thread):
+    """
+    Runs assign_pending_orders() every `interval` seconds in the server
+    process. A lock file keeps it to one process per host, another process
+    takes over if the one holding it exits.
+    """
+    def __init__(self, interval):
+        super().__init__(name='order-assignment', daemon=True)
+        self.interval = interval
+        self.lock_file = None
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.acquire():
+                continue
+            try:
+                assign_pending_orders()
+            except Exception:
+                logger.exception("Automatic order assignment failed")
+            finally:
+                close_old_connections()
+
+    def acquire(self):
+        if self.lock_file is None:
+            path = getattr(settings, 'ORDER_ASSIGNMENT_LOCK_FILE',
+                           os.path.join(tempfile.gettempdir(), 'littlemon-assignment.lock'))
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            # Held for the life of the process
+            self.lock_file = lock_file
+        return True
+
+
+_worker = None
+
+
+def start_worker():
+    """
+    Starts the AssignmentWorker when ORDER_ASSIGNMENT_INTERVAL is set
+    (called by wsgi.py and asgi.py, so management commands never start it)
+    """
+    global _worker
+    interval = getattr(settings, 'ORDER_ASSIGNMENT_INTERVAL', None)
+    if not interval or _worker is not None:
+        return
+    if fcntl is None:
+        logger.warning("ORDER_ASSIGNMENT_INTERVAL needs fcntl, run manage.py assign_orders instead")
+        return
+    _worker = AssignmentWorker(interval)
+    _worker.start()
@@ -0,0 +1,221 @@
+"""
+Native async versions of the hot read endpoints, served under ASGI.
+
+Each AsyncReadView shadows a DRF view on the same URL. It answers plain
+JSON GETs itself with the async ORM and the async token and role lookups,
+and hands everything else (writes, the browsable API, query parameters it
+doesn't handle such as search or the manager filters) to the DRF view, so
+both paths give the same responses. See urls.py and manage.py bench_async.
+"""
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from . import views
+from .authentication import CachedTokenAuthentication
+from .db import ReadOnlyViewMixin, read_only_queries
+from .fast_serializers import menu_item_reader, cart_reader, order_reader
+from .menu_cache import menu_catalog
+from .metrics import timed, timed_handler
+from .models import MenuItem
+from .order_feed import parse_since, parse_wait, wait_for_events
+from .pagination import MenuItemKeysetPagination, OrderKeysetPagination
+from .utils import aget_user_roles, get_user_roles
+
+
+class AsyncReadView(View):
+    sync_view = None
+    # Query parameters the async path understands, any other one goes to sync_view
+    query_params = frozenset()
+    fallback = None
+    renderer = JSONRenderer()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(fallback=sync_to_async(cls.sync_view.as_view()), **initkwargs)
+        # Like the DRF views: no session, so no CSRF
+        return csrf_exempt(view)
+
+    def handles(self, request):
+        if request.method != 'GET' or request.GET.get('format', 'json') != 'json':
+            return False
+        if not set(request.GET).difference({'format'}) <= self.query_params:
+            return False
+        # The browsable API stays with DRF
+        return 'text/html' not in request.headers.get('Accept', '')
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not self.handles(request):
+            return await self.fallback(request, *args, **kwargs)
+
+        # The DRF view provides the permissions, throttles and querysets
+        self.drf_view = self.sync_view(format_kwarg=None, headers={})
+        self.drf_view.setup(request, *args, **kwargs)
+        # Same database routing as the DRF view (see db.py)
+        routing = read_only_queries() if issubclass(self.sync_view, ReadOnlyViewMixin) else nullcontext()
+        try:
+            with routing:
+                await self.initial(request)
+                with timed_handler(request):
+                    response = await self.get(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = self.error_response(exc)
+        response['Allow'] = ', '.join(self.drf_view.allowed_methods)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    async def initial(self, request):
+        """
+        Authentication, permissions and throttles, in DRF's order
+        """
+        with timed(request, 'auth'):
+            result = await CachedTokenAuthentication().aauthenticate(request)
+            request.user = result[0] if result else AnonymousUser()
+            # Resolved here so that the permission classes need no I/O
+            await aget_user_roles(request.user)
+
+        with timed(request, 'permissions'):
+            for permission in self.drf_view.get_permissions():
+                if not permission.has_permission(request, self.drf_view):
+                    if result is None:
+                        raise exceptions.NotAuthenticated()
+                    raise exceptions.PermissionDenied(getattr(permission, 'message', None),
+                                                      getattr(permission, 'code', None))
+
+        with timed(request, 'throttle'):
+            # The throttle store is a local SQLite file: keep it off the event loop
+            await sync_to_async(self.drf_view.check_throttles, thread_sensitive=False)(request)
+
+    def respond(self, data, status_code=status.HTTP_200_OK, headers=None):
+        with timed(self.request, 'render'):
+            content = b'' if data is None else self.renderer.render(data)
+        response = HttpResponse(content, status=status_code, content_type='application/json', headers=headers)
+        if not content:
+            del response['Content-Type']
+        return response
+
+    def error_response(self, exc):
+        # What APIView.handle_exception() does, minus the content negotiation
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = CachedTokenAuthentication().authenticate_header(self.request)
+        response = self.drf_view.get_exception_handler()(exc, self.drf_view.get_exception_handler_context())
+        if response is None:
+            raise exc
+        headers = {name: value for name, value in response.items() if name != 'Content-Type'}
+        return self.respond(response.data, response.status_code, headers)
+
+
+class MenuItemListView(AsyncReadView):
+    sync_view = views.MenuItemListCreateView
+    query_params = frozenset({'cursor', 'page_size', 'with_total'})
+
+    async def get(self, request, *args, **kwargs):
+        # Same ETag and cache entries as MenuItemListCreateView.list()
+        version = menu_catalog.version()
+        key = f'json|{request.build_absolute_uri()}'
+        etag = menu_catalog.etag(version, key)
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in if_none_match or etag in [tag.removeprefix('W/') for tag in if_none_match]:
+            return self.respond(None, status.HTTP_304_NOT_MODIFIED, {'ETag': etag})
+
+        data = menu_catalog.get(version, key)
+        if data is None:
+            queryset = self.drf_view.get_queryset().order_by(*self.sync_view.ordering)
+            paginator = MenuItemKeysetPagination()
+            page = await paginator.apaginate_queryset(menu_item_reader.values(queryset), Request(request))
+            data = paginator.get_paginated_response(menu_item_reader.render(page)).data
+            menu_catalog.set(version, key, data)
+        return self.respond(data, headers={'ETag': etag})
+
+
+class MenuItemDetailView(AsyncReadView):
+    sync_view = views.MenuItemRetrieveUpdateDeleteView
+
+    async def get(self, request, pk):
+        row = await menu_item_reader.values(MenuItem.objects.filter(pk=pk)).afirst()
+        if row is None:
+            raise exceptions.NotFound('No MenuItem matches the given query.')
+        return self.respond(menu_item_reader.render_row(row))
+
+
+class CartView(AsyncReadView):
+    sync_view = views.CartCustomerView
+
+    async def get(self, request, *args, **kwargs):
+        rows = [row async for row in cart_reader.values(self.drf_view.get_queryset())]
+        return self.respond({
+            'items': await cart_reader.arender(rows),
+            'total': sum(row['price'] for row in rows),
+        })
+
+
+class OrderView(AsyncReadView):
+    sync_view = views.OrderCustomerView
+    # The manager filters (status, date, delivery_crew) go to the DRF view
+    query_params = frozenset({'cursor', 'page_size', 'with_total'})
+
+    async def get(self, request, orderId=None):
+        # Same selection as OrderCustomerView.get()
+        if orderId and "Customer" in get_user_roles(request.user):
+            for model, reader in self.drf_view.order_sources:
+                order = await model.objects.filter(id=orderId).values('user_id').afirst()
+                if order is not None:
+                    break
+            error = self.drf_view.order_access_error(order, request.user)
+            if error is not None:
+                return self.respond(error.data, error.status_code)
+            items = reader.values(reader.model.objects.filter(order_id=orderId))
+            return self.respond(await reader.arender([row async for row in items]))
+
+        orders = self.drf_view.get_orders(request.user, request.GET)
+        paginator = OrderKeysetPagination()
+        page = await paginator.apaginate_queryset(order_reader.values(orders), Request(request))
+        return self.respond(paginator.get_paginated_response(await order_reader.arender(page)).data)
+
+
+class OrderEventFeedView(AsyncReadView):
+    """
+    Long-poll (JSON) or Server-Sent Events (Accept: text/event-stream) over
+    the order change feed
+    """
+    sync_view = views.OrderEventView
+    query_params = frozenset({'since', 'wait'})
+
+    async def get(self, request, *args, **kwargs):
+        since = parse_since(request)
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return self.stream(request.user, since)
+        events, cursor = await wait_for_events(request.user, since, parse_wait(request))
+        return self.respond({'events': events, 'cursor': cursor})
+
+    def stream(self, user, since):
+        keepalive = getattr(settings, 'ORDER_FEED_KEEPALIVE', 15)
+        # Streams end now and then so that auth and throttles are checked again
+        deadline = time.monotonic() + getattr(settings, 'ORDER_FEED_STREAM_SECONDS', 300)
+
+        async def messages():
+            cursor = since
+            yield 'retry: 2000\n\n'
+            while time.monotonic() < deadline:
+                events, cursor = await wait_for_events(user, cursor, keepalive)
+                for event in events:
+                    yield f"id: {event['id']}\nevent: {event['kind']}\ndata: {self.renderer.render(event).decode()}\n\n"
+                # An id without data moves Last-Event-ID past the events the user
+                # can't see, and keeps the connection alive
+                yield f'id: {cursor}\n\n'
+
+        return StreamingHttpResponse(messages(), content_type='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
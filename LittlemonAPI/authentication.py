@@ -0,0 +1,142 @@
+"""
+Token authentication backed by a bounded in-process LRU.
+
+Tokens resolved from the database are kept for TOKEN_CACHE_TTL seconds.
+Deleting a token (djoser logout, admin, shell) or changing the password
+or is_active of a user bumps a host-wide revocation marker, which empties
+the LRU of every process on its next lookup. Other changes to a user
+reach the cached copy within TOKEN_CACHE_TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from .utils import FileVersionMarker
+from .metrics import registry
+
+
+class TokenCache:
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.marker = FileVersionMarker('TOKEN_CACHE_REVOCATION_FILE', 'littlemon-tokens.version')
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._seen_version = None
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self.marker.version()
+
+    def get(self, version, key):
+        now = time.monotonic()
+        with self._lock:
+            if version != self._seen_version:
+                self._entries.clear()
+                self._seen_version = version
+
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, version, key, user, token):
+        # version is the one the miss was seen under: a revocation since
+        # then (in this process or another) may have deleted the token
+        # after it was read, so it must not be cached
+        current = self.marker.version()
+        with self._lock:
+            if version != self._seen_version or version != current:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self):
+        self.marker.bump()
+        with self._lock:
+            self._entries.clear()
+            self._seen_version = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache(
+    max_entries=getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', 1024),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+registry.register_counters(lambda: {
+    'token_cache_hits_total': token_cache.hits,
+    'token_cache_misses_total': token_cache.misses,
+})
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that skips the Token/User
+    query while the token is cached.
+    """
+    def authenticate_credentials(self, key):
+        version = token_cache.version()
+        cached = token_cache.get(version, key)
+        if cached is not None:
+            user, token = cached
+            # Each request gets its own user instance (roles are attached to it)
+            return copy.copy(user), token
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(version, key, copy.copy(user), token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate() for the async views, same errors
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        elif len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.'))
+
+        version = token_cache.version()
+        cached = token_cache.get(version, key)
+        if cached is not None:
+            user, token = cached
+            return copy.copy(user), token
+
+        try:
+            token = await self.get_model().objects.select_related('user').aget(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token_cache.set(version, key, copy.copy(token.user), token)
+        return token.user, token
@@ -0,0 +1,78 @@
+"""
+SQLite tuning and read routing.
+
+Every new SQLite connection gets the SQLITE_PRAGMAS setting (WAL, so
+that readers and the writer don't block each other, a busy timeout
+instead of immediate "database is locked" errors, a bigger page cache
+and mmap).
+Connections whose settings have READ_ONLY are also switched to
+query_only.
+
+ReadReplicaRouter sends the reads made while a read-only view is
+running (see ReadOnlyViewMixin) to the 'replica' alias, a separate
+read-only connection to the same file, and everything else to default.
+"""
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+REPLICA = 'replica'
+
+_read_only = contextvars.ContextVar('littlemon_read_only', default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    read_only = connection.settings_dict.get('READ_ONLY', False)
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            if read_only and name == 'journal_mode':
+                # Set by the writers; a read-only connection can't change it
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if read_only:
+            cursor.execute('PRAGMA query_only = ON')
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and REPLICA in connections.settings:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class read_only_queries:
+    """
+    Context manager sending the reads made inside it to the replica
+    """
+    def __enter__(self):
+        self.token = _read_only.set(True)
+
+    def __exit__(self, *exc_info):
+        _read_only.reset(self.token)
+
+
+class ReadOnlyViewMixin:
+    """
+    Routes the queries of GET and HEAD requests to the replica
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with read_only_queries():
+            return super().dispatch(request, *args, **kwargs)
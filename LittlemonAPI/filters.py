@@ -0,0 +1,22 @@
+import django_filters
+
+from .models import Order
+
+
+class OrderFilter(django_filters.FilterSet):
+    """
+    Manager filters for the order listing, each one backed by an index
+    (status, date and the delivery_crew foreign key)
+    """
+    # Same convention as PATCH /api/orders/<id>: 0 is pending, 1 is delivered
+    status = django_filters.TypedChoiceFilter(
+        choices=(('0', 'Pending'), ('1', 'Delivered')),
+        coerce=lambda value: value == '1',
+    )
+
+    class Meta:
+        model = Order
+        fields = {
+            'date': ['exact', 'gte', 'lte'],
+            'delivery_crew': ['exact', 'isnull'],
+        }
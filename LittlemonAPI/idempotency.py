@@ -0,0 +1,150 @@
+"""
+Idempotency-Key support for the POSTs that clients retry (checkout and
+adding to the cart).
+
+The first request carrying a key runs the view; its response is kept in a
+bounded in-process LRU keyed by (user, key) for IDEMPOTENCY_TTL seconds,
+and a retry with the same key gets it back without running the view again.
+A duplicate that arrives while the first request is still running waits
+for it instead of racing it. 5xx responses aren't kept, so that those can
+be retried, and reusing a key for a different request is a 422.
+
+The store is per process: with several workers, only the worker that
+served the first request recognises its retries.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import registry
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'expires', 'done', 'response')
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.expires = None
+        self.done = threading.Event()
+        # (status code, data) once done, None if the request failed
+        self.response = None
+
+
+class IdempotencyStore:
+    def __init__(self, max_entries=10_000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.replays = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint):
+        """
+        Returns (entry, True) when the caller is the first with this key and
+        has to complete() the entry, (entry, False) for a duplicate
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            # Entries in flight never expire
+            if entry is not None and (entry.expires is None or entry.expires > now):
+                self._entries.move_to_end(key)
+                return entry, False
+
+            entry = self._entries[key] = _Entry(fingerprint)
+            self._entries.move_to_end(key)
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                # Oldest finished entries first: a request in flight keeps its
+                # key, or a retry would run the view a second time
+                finished = (old_key for old_key, old in self._entries.items() if old.expires is not None)
+                for old_key in list(islice(finished, excess)):
+                    del self._entries[old_key]
+            return entry, True
+
+    def complete(self, key, entry, response):
+        """
+        Keeps `response` for the retries, or forgets the key when it's None,
+        and wakes up the duplicates waiting for it
+        """
+        with self._lock:
+            if response is None:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.response = response
+                entry.expires = time.monotonic() + self.ttl
+        entry.done.set()
+
+    def replayed(self):
+        with self._lock:
+            self.replays += 1
+
+
+idempotency_store = IdempotencyStore(
+    max_entries=getattr(settings, 'IDEMPOTENCY_MAX_ENTRIES', 10_000),
+    ttl=getattr(settings, 'IDEMPOTENCY_TTL', 24 * 3600),
+)
+registry.register_counters(lambda: {'idempotent_replays_total': idempotency_store.replays})
+
+
+def fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def idempotent(method):
+    """
+    Decorator for the post() of an APIView: honours the Idempotency-Key
+    header, requests without one run as usual
+    """
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"message": f"{HEADER} should be 1 to {MAX_KEY_LENGTH} characters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        store_key = (request.user.pk, key)
+        request_fingerprint = fingerprint(request)
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT', 30)
+        while True:
+            entry, first = idempotency_store.claim(store_key, request_fingerprint)
+            if first:
+                break
+            if entry.fingerprint != request_fingerprint:
+                return Response({"message": f"This {HEADER} was already used for another request"},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if not entry.done.wait(max(0.0, deadline - time.monotonic())):
+                return Response({"message": f"A request with this {HEADER} is still in progress"},
+                                status=status.HTTP_409_CONFLICT)
+            if entry.response is not None:
+                idempotency_store.replayed()
+                status_code, data = entry.response
+                return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+            # The first request failed and let go of the key: run this one
+
+        response = None
+        try:
+            response = method(view, request, *args, **kwargs)
+        finally:
+            keep = response is not None and response.status_code < 500
+            idempotency_store.complete(store_key, entry, (response.status_code, response.data) if keep else None)
+        return response
+    return wrapper
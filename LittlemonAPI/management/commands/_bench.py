@@ -0,0 +1,89 @@
+"""
+Helpers shared by the benchmark commands (not a command itself).
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+
+@contextmanager
+def benchmark_database(keep=False):
+    """
+    Runs the block against a freshly migrated throwaway SQLite file, with
+    throttling disabled, so benchmarks never touch db.sqlite3.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(
+        tempfile.gettempdir(), f'littlemon-bench-{os.getpid()}.sqlite3'
+    )
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # Mirrors of default (the read-only 'replica') follow it to the throwaway file
+    mirrors = {alias: connections.settings[alias]['NAME'] for alias in connections.settings
+               if connections.settings[alias]['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS}
+    for alias in mirrors:
+        connections[alias].close()
+        connections.settings[alias]['NAME'] = connection.settings_dict['NAME']
+    rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+    # The shared cache is host-wide: cached roles of the throwaway users
+    # would otherwise leak to the real users with the same ids
+    cache_dir = tempfile.TemporaryDirectory(prefix='littlemon-bench-cache-')
+    caches = {**settings.CACHES, 'shared': {**settings.CACHES['shared'], 'LOCATION': cache_dir.name}}
+    try:
+        with override_settings(REST_FRAMEWORK=rest_framework, CACHES=caches):
+            yield
+    finally:
+        for alias, name in mirrors.items():
+            connections[alias].close()
+            connections.settings[alias]['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+        teardown_test_environment()
+        cache_dir.cleanup()
+
+
+def create_user(username, *groups):
+    """
+    Creates a user in the given groups and returns (user, token key)
+    """
+    user = User.objects.create_user(username=username, password=None)
+    for name in groups:
+        user.groups.add(Group.objects.get_or_create(name=name)[0])
+    return user, Token.objects.create(user=user).key
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StatementTimer:
+    """
+    connection.execute_wrapper() callable counting queries and their time
+    """
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+        self.first_write = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        statement = sql.lstrip().upper()
+        # BEGIN IMMEDIATE (see the transaction_mode setting) takes the write lock too
+        if self.first_write is None and (statement.startswith('BEGIN IMMEDIATE') or
+                                         not statement.startswith(('SELECT', 'BEGIN', 'SAVEPOINT', 'RELEASE'))):
+            self.first_write = start
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - start
@@ -0,0 +1,39 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from LittlemonAPI.archive import archive_orders
+from LittlemonAPI.models import Order
+
+
+class Command(BaseCommand):
+    help = ("Moves the delivered orders older than --days, with their items, to the archive tables "
+            "(GET /api/orders/history), one transaction per chunk")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90),
+                            help="Archive the delivered orders dated more than this many days ago")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Orders per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders to archive")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        before = date.today() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = Order.objects.filter(status=True, date__lt=before).count()
+            self.stdout.write(f"{count} delivered orders dated before {before} would be archived")
+            return
+
+        start = time.perf_counter()
+        moved = archive_orders(before, options['chunk_size'], on_chunk=self.report_chunk)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} orders dated before {before} archived in {elapsed:.1f}s "
+            f"({moved / max(elapsed, 1e-9):.0f} orders/sec)"
+        ))
+
+    def report_chunk(self, count):
+        if self.verbosity > 1:
+            self.stdout.write(f"  {count} orders")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from LittlemonAPI.assignment import assign_pending_orders
+
+
+class Command(BaseCommand):
+    help = ("Assigns the unassigned, undelivered orders to the least loaded delivery crew members, "
+            "in batches, and reports the throughput")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Orders per UPDATE (default: ORDER_ASSIGNMENT_BATCH)")
+        parser.add_argument('--loop', action='store_true', help="Keep running, checking every --interval seconds")
+        parser.add_argument('--interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            assigned = assign_pending_orders(options['batch_size'], on_batch=self.report_batch)
+            elapsed = time.perf_counter() - start
+            if assigned or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{assigned} orders assigned in {elapsed:.2f}s ({assigned / max(elapsed, 1e-9):.0f} orders/sec)"
+                ))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def report_batch(self, count, seconds):
+        self.stdout.write(f"  batch of {count} in {seconds * 1000:.1f}ms ({count / max(seconds, 1e-9):.0f} orders/sec)")
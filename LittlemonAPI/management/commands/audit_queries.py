@@ -0,0 +1,207 @@
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from LittlemonAPI.archive import archive_orders
+from LittlemonAPI.menu_cache import bump_menu_version
+from LittlemonAPI.models import Category, MenuItem, Cart, Order, OrderEvent
+from ._bench import benchmark_database
+
+
+class Command(BaseCommand):
+    help = ("Runs every read endpoint and the background jobs' queries on seeded data, "
+            "reports their timings and flags full scans and temp B-trees in their EXPLAIN QUERY PLAN")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50_000)
+        parser.add_argument('--menu-items', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--delivery-crew', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case (the median is reported)")
+        parser.add_argument('--compare', metavar='MIGRATION',
+                            help="Also audit with LittlemonAPI migrated back to MIGRATION (e.g. 0006_order_archive) "
+                                 "and show its SQL timings in a 'before' column")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        with benchmark_database():
+            self.populate(options)
+            cases = self.cases()
+            before = None
+            if options['compare']:
+                call_command('migrate', 'LittlemonAPI', options['compare'], verbosity=0)
+                before = self.audit(cases, options['repeat'])
+                call_command('migrate', 'LittlemonAPI', verbosity=0)
+            after = self.audit(cases, options['repeat'])
+        self.report(after, before, options['compare'])
+
+    def populate(self, options):
+        start = time.perf_counter()
+        # Orders up to today, so that the live and the archived tables both get their share
+        call_command('seed', orders=options['orders'], menu_items=options['menu_items'], users=options['users'],
+                     delivery_crew=options['delivery_crew'], categories=100, carts=500, until=date.today(),
+                     stdout=StringIO())
+        # Recent orders stay live, the older delivered ones go to the history
+        # (the rollups, rebuilt by seed, cover both)
+        self.archive_before = date.today() - timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90))
+        archive_orders(self.archive_before, 5000)
+        OrderEvent.objects.bulk_create(
+            (OrderEvent(order_id=pk, kind=OrderEvent.CREATED, user_id=user_id, delivery_crew_id=crew_id, status=done)
+             for pk, user_id, crew_id, done in Order.objects.values_list('id', 'user_id', 'delivery_crew_id', 'status')),
+            batch_size=5000,
+        )
+        if self.verbosity > 1:
+            self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    def cases(self):
+        """
+        Returns [(name, callable)]: the GET endpoints, as a user of the role
+        allowed to call them, and the queries of the background jobs
+        """
+        clients = {'anonymous': Client()}
+        for role in ('Customer', 'Manager', 'Delivery Crew'):
+            if role == 'Customer':
+                user = User.objects.get(pk=Cart.objects.values_list('user_id', flat=True).first())
+            else:
+                user = User.objects.filter(groups__name=role).order_by('id').first()
+            token = Token.objects.get_or_create(user=user)[0].key
+            clients[role] = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        customer = Cart.objects.values_list('user_id', flat=True).first()
+        crew_ids = list(User.objects.filter(groups__name='Delivery Crew').order_by('id').values_list('id', flat=True))
+        crew = crew_ids[0]
+        menu_item = MenuItem.objects.order_by('id').first()
+        category = Category.objects.order_by('id').first()
+        order = Order.objects.filter(user_id=customer).order_by('-id').first()
+
+        def get(role, path, menu=False):
+            def request():
+                if menu:
+                    # The catalog is cached: measure the queries, not the cache
+                    bump_menu_version()
+                response = clients[role].get(path)
+                assert response.status_code == 200, f"{path}: {response.status_code}"
+            return request
+
+        def job(queryset):
+            return lambda: list(queryset.all())
+
+        return [
+            ('GET menu-items', get('anonymous', '/api/menu-items/', menu=True)),
+            ('GET menu-items ?category__title', get('anonymous', f'/api/menu-items/?category__title={category.title}', menu=True)),
+            ('GET menu-items ?ordering=-price', get('anonymous', '/api/menu-items/?ordering=-price', menu=True)),
+            ('GET menu-items ?ordering=category__title', get('anonymous', '/api/menu-items/?ordering=category__title', menu=True)),
+            ('GET menu-items ?search', get('anonymous', f'/api/menu-items/?search={menu_item.title}', menu=True)),
+            ('GET menu-items/<id>', get('Customer', f'/api/menu-items/{menu_item.pk}')),
+            ('GET cart (customer)', get('Customer', '/api/cart/menu-items/')),
+            ('GET orders (customer)', get('Customer', '/api/orders/')),
+            ('GET orders/<id> (customer)', get('Customer', f'/api/orders/{order.pk}' if order else '/api/orders/')),
+            ('GET orders (crew)', get('Delivery Crew', '/api/orders/')),
+            ('GET orders (manager)', get('Manager', '/api/orders/')),
+            ('GET orders ?status=0 (manager)', get('Manager', '/api/orders/?status=0')),
+            ('GET orders ?delivery_crew (manager)', get('Manager', f'/api/orders/?delivery_crew={crew}')),
+            ('GET orders ?date (manager)', get('Manager', f'/api/orders/?date={date.today()}')),
+            ('GET orders/history (customer)', get('Customer', '/api/orders/history')),
+            ('GET orders/history (crew)', get('Delivery Crew', '/api/orders/history')),
+            ('GET orders/events (customer)', get('Customer', '/api/orders/events?since=0')),
+            ('GET orders/events (crew)', get('Delivery Crew', '/api/orders/events?since=0')),
+            ('GET analytics/sales (manager)', get('Manager', '/api/analytics/sales')),
+            ('assign_orders: pending', job(Order.objects.filter(status=False, delivery_crew__isnull=True)
+                                          .order_by('id').values_list('id', 'user_id')[:500])),
+            ('assign_orders: crew loads', job(Order.objects.filter(status=False, delivery_crew_id__in=crew_ids)
+                                             .values('delivery_crew_id').annotate(count=Count('id'))
+                                             .values_list('delivery_crew_id', 'count'))),
+            ('archive_orders: chunk', job(Order.objects.filter(status=True, date__lt=self.archive_before)
+                                         .order_by('date', 'id').values_list('id', flat=True)[:1000])),
+        ]
+
+    def audit(self, cases, repeat):
+        """
+        Runs each case once to capture its SELECTs and their plans, then
+        `repeat` more times for the timings: the whole case, and its SELECTs
+        replayed on their own (what the indexes change, without the
+        request handling around them). Returns {name: result}.
+        """
+        results = {}
+        for name, run in cases:
+            statements = []
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.capture(alias, statements)))
+                run()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+
+            plans, sql_timings = [], [0.0] * repeat
+            for alias, sql, params in dict.fromkeys(statements):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    details = [row[3] for row in cursor.fetchall()]
+                    for i in range(repeat):
+                        start = time.perf_counter()
+                        cursor.execute(sql, params)
+                        cursor.fetchall()
+                        sql_timings[i] += time.perf_counter() - start
+                plans.append((sql, details, [detail for detail in details if flagged(detail)]))
+            results[name] = {
+                'ms': statistics.median(timings) * 1000,
+                'sql_ms': statistics.median(sql_timings) * 1000,
+                'queries': len(statements),
+                'plans': plans,
+            }
+        return results
+
+    def capture(self, alias, statements):
+        def wrapper(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                statements.append((alias, sql, tuple(params or ())))
+            return execute(sql, params, many, context)
+        return wrapper
+
+    def report(self, after, before, migration):
+        if before is None:
+            self.stdout.write(f"{'case':<42} {'ms':>8} {'sql ms':>8} {'queries':>8}  flags")
+        else:
+            self.stdout.write(f"{'case':<42} {'ms':>8} {'sql ms':>8} {'before':>8} {'queries':>8}  flags")
+        flagged_cases = 0
+        for name, result in after.items():
+            flags = sorted({flag for _, _, details in result['plans'] for flag in details})
+            flagged_cases += bool(flags)
+            timing = f"{result['ms']:>8.2f} {result['sql_ms']:>8.2f}"
+            if before is not None:
+                timing = f"{timing} {before[name]['sql_ms']:>8.2f}"
+            line = f"{name:<42} {timing} {result['queries']:>8}  {'; '.join(flags) or '-'}"
+            self.stdout.write(self.style.WARNING(line) if flags else line)
+            if self.verbosity > 1:
+                for sql, details, _ in result['plans']:
+                    self.stdout.write(f"    {sql}")
+                    for detail in details:
+                        self.stdout.write(f"      {'!' if flagged(detail) else ' '} {detail}")
+
+        summary = f"{flagged_cases} of {len(after)} cases with a full scan or a temp B-tree"
+        self.stdout.write(self.style.WARNING(summary) if flagged_cases else self.style.SUCCESS(summary))
+
+
+def flagged(detail):
+    """
+    True for the plan steps worth an index: a table scanned without one
+    (not an index walk, a virtual table or a constant row) or a temp B-tree
+    built for ORDER BY, GROUP BY or DISTINCT
+    """
+    if 'TEMP B-TREE' in detail:
+        return True
+    return (detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail
+            and detail != 'SCAN CONSTANT ROW')
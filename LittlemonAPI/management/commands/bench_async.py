@@ -0,0 +1,119 @@
+import asyncio
+import time
+from datetime import date
+from types import ModuleType
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from LittlemonAPI.menu_cache import bump_menu_version
+from LittlemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from LittlemonAPI.urls import get_urlpatterns
+from ._bench import benchmark_database, create_user, percentile
+
+
+def urlconf(name, async_reads):
+    module = ModuleType(name)
+    module.urlpatterns = [path('api/', include(get_urlpatterns(async_reads)))]
+    return module
+
+
+class Command(BaseCommand):
+    help = ("Compares the sync DRF views and the async views under ASGI (AsyncClient) "
+            "at growing concurrency; responses have to be identical")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,8,32,64', help="Comma separated concurrency levels")
+        parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint and level")
+        parser.add_argument('--menu-items', type=int, default=500)
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        modes = {'sync': urlconf('bench_sync_urls', False), 'async': urlconf('bench_async_urls', True)}
+
+        with benchmark_database():
+            tokens = self.populate(options['menu_items'])
+            endpoints = [
+                ('menu list', '/api/menu-items/?page_size=20', None),
+                ('menu detail', f"/api/menu-items/{MenuItem.objects.order_by('id').values_list('id', flat=True).first()}",
+                 tokens['Customer']),
+                ('cart', '/api/cart/menu-items/', tokens['Customer']),
+                ('orders', '/api/orders/?page_size=20', tokens['Customer']),
+                ('orders (manager)', '/api/orders/?page_size=20', tokens['Manager']),
+            ]
+
+            self.check_identical(modes, endpoints)
+
+            self.stdout.write(f"{'endpoint':<18} {'conc':>5} {'sync rps':>9} {'async rps':>10} "
+                              f"{'sync p95':>9} {'async p95':>10}")
+            for name, url, token in endpoints:
+                for level in levels:
+                    results = {}
+                    for mode, module in modes.items():
+                        with override_settings(ROOT_URLCONF=module):
+                            results[mode] = asyncio.run(self.load(url, token, level, options['requests']))
+                    (sync_rps, sync_p95), (async_rps, async_p95) = results['sync'], results['async']
+                    self.stdout.write(f"{name:<18} {level:>5} {sync_rps:>9.0f} {async_rps:>10.0f} "
+                                      f"{sync_p95:>8.1f}ms {async_p95:>8.1f}ms")
+
+    def populate(self, menu_items):
+        category = Category.objects.create(title='Bench', slug='bench')
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Bench item {i}', price='4.50', category=category) for i in range(menu_items)
+        )
+        menu_ids = list(MenuItem.objects.order_by('id').values_list('id', flat=True)[:20])
+
+        customer, customer_token = create_user('bench-customer', 'Customer')
+        crew = create_user('bench-crew', 'Delivery Crew')[0]
+        manager_token = create_user('bench-manager', 'Manager')[1]
+        Cart.objects.add_items(customer, dict.fromkeys(menu_ids[:5], 2))
+        for menu_id in menu_ids:
+            order = Order.objects.create(user=customer, delivery_crew=crew, total='9.00', date=date.today())
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, menuitem_id=item_id, quantity=2, unit_price='4.50', price='9.00')
+                for item_id in menu_ids[:3]
+            )
+        return {'Customer': customer_token, 'Manager': manager_token}
+
+    def check_identical(self, modes, endpoints):
+        async def fetch(url, token):
+            headers = {'Authorization': f'Token {token}'} if token else {}
+            return await AsyncClient().get(url, headers=headers)
+
+        for name, url, token in endpoints:
+            responses = {}
+            for mode, module in modes.items():
+                # Each side has to build the menu page itself
+                bump_menu_version()
+                with override_settings(ROOT_URLCONF=module):
+                    responses[mode] = asyncio.run(fetch(url, token))
+            sync, async_ = responses['sync'], responses['async']
+            if (sync.status_code, sync.content) != (async_.status_code, async_.content):
+                raise CommandError(f"{name}: async response differs\n{sync.content[:300]}\n{async_.content[:300]}")
+            if sync.status_code != 200:
+                raise CommandError(f"{name}: {sync.status_code} {sync.content[:300]}")
+
+    async def load(self, url, token, concurrency, total):
+        """
+        Sends `total` GETs from `concurrency` concurrent clients and returns
+        (requests/sec, p95 latency in ms)
+        """
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        latencies = []
+        remaining = iter(range(total))
+
+        async def client():
+            # Headers given to AsyncClient() itself end up as HTTP_HTTP_* in META
+            session = AsyncClient()
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await session.get(url, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f"{url}: {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start), percentile(latencies, 95)
@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+
+from LittlemonAPI.models import Category, MenuItem, Cart
+from ._bench import benchmark_database, create_user, StatementTimer
+
+
+class Command(BaseCommand):
+    help = "Benchmarks POST /api/orders/ (checkout) for growing cart sizes on a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,50,100,250,500',
+                            help="Comma separated cart sizes (number of lines)")
+        parser.add_argument('--repeat', type=int, default=5, help="Checkouts per cart size")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        with benchmark_database():
+            category = Category.objects.create(title='Bench')
+            MenuItem.objects.bulk_create(
+                MenuItem(title=f'Bench item {i}', price='4.50', category=category)
+                for i in range(max(sizes))
+            )
+            menu_ids = list(MenuItem.objects.order_by('id').values_list('id', flat=True))
+            user, token = create_user('bench-customer', 'Customer')
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+            self.stdout.write(f"{'lines':>6} {'latency ms':>11} {'lock ms':>9} {'queries':>8}")
+            for size in sizes:
+                latencies, locks, queries = [], [], []
+                for _ in range(options['repeat']):
+                    Cart.objects.add_items(user, {menu_id: 2 for menu_id in menu_ids[:size]})
+
+                    timer = StatementTimer()
+                    committed = []
+
+                    def track_commit(execute, sql, params, many, context):
+                        # Register once, on the first write of the checkout transaction
+                        # (once inside it: BEGIN runs before the atomic block is entered)
+                        result = timer(execute, sql, params, many, context)
+                        if timer.first_write is not None and not committed and connection.in_atomic_block:
+                            committed.append(None)
+                            transaction.on_commit(lambda: committed.append(time.perf_counter()))
+                        return result
+
+                    start = time.perf_counter()
+                    with connection.execute_wrapper(track_commit):
+                        response = client.post('/api/orders/', format='json')
+                    latencies.append(time.perf_counter() - start)
+
+                    if response.status_code != 201:
+                        self.stderr.write(f"checkout failed with {response.status_code}: {response.content[:200]}")
+                        return
+                    locks.append(committed[-1] - timer.first_write)
+                    queries.append(timer.count)
+
+                self.stdout.write(
+                    f"{size:>6} {statistics.median(latencies) * 1000:>11.2f} "
+                    f"{statistics.median(locks) * 1000:>9.2f} {max(queries):>8}"
+                )
@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import date
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import resolve, Resolver404
+
+from LittlemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from ._bench import benchmark_database, create_user, percentile, StatementTimer
+
+
+class Command(BaseCommand):
+    help = ("Replays recorded API traffic (see TrafficRecorderMiddleware) in-process or against a server, "
+            "reports latency per endpoint and compares it to a baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=getattr(settings, 'TRAFFIC_RECORD_PATH', None) or 'traffic.jsonl',
+                            help="Recorded traffic, one JSON request per line")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=1, help="Times the whole recording is replayed")
+        parser.add_argument('--url', help="Replay against a running server (e.g. http://127.0.0.1:8000) "
+                                          "instead of in-process on a throwaway database")
+        parser.add_argument('--token', action='append', default=[], metavar='ROLE=KEY',
+                            help="Token to use for a role with --url, e.g. Manager=abc123")
+        parser.add_argument('--no-warmup', action='store_true',
+                            help="Don't replay the recording once, unmeasured, to warm the caches first")
+        parser.add_argument('--menu-items', type=int, default=50, help="Menu items to create in-process")
+        parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+        parser.add_argument('--baseline', help="Fail if the results regress from this JSON file")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative slowdown of p95 and requests/sec against the baseline")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file']) as source:
+                recorded = [json.loads(line) for line in source if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"{options['file']} not found, record traffic with TRAFFIC_RECORD_PATH first")
+        if not recorded:
+            raise CommandError(f"{options['file']} is empty")
+        traffic = recorded * options['repeat']
+
+        if options['url']:
+            tokens = dict(token.split('=', 1) for token in options['token'])
+            send = self.http_sender(options['url'].rstrip('/'), tokens)
+            if not options['no_warmup']:
+                self.replay(recorded, options['concurrency'], send, count_queries=False)
+            results, elapsed = self.replay(traffic, options['concurrency'], send, count_queries=False)
+        else:
+            with benchmark_database():
+                tokens = self.populate({entry['role'] for entry in recorded}, options['menu_items'])
+                send = self.client_sender(tokens)
+                if not options['no_warmup']:
+                    self.replay(recorded, options['concurrency'], send, count_queries=False)
+                results, elapsed = self.replay(traffic, options['concurrency'], send, count_queries=True)
+
+        report = self.report(results, elapsed)
+        if options['baseline']:
+            with open(options['baseline']) as source:
+                regressions = self.compare(report, json.load(source), options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression against the baseline"))
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+    def populate(self, roles, menu_items):
+        """
+        Gives the throwaway database a menu, one user per recorded role and a
+        few orders, and returns {role: token key}
+        """
+        categories = Category.objects.bulk_create(
+            Category(slug=f'category-{i}', title=f'Category {i}') for i in range(1, 4)
+        )
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Menu item {i}', price='5.50', featured=i % 5 == 0, category=categories[i % 3])
+            for i in range(1, menu_items + 1)
+        )
+
+        tokens, users = {}, {}
+        for role in sorted(roles - {'anonymous'}):
+            groups = () if role == 'user' else (role,)
+            users[role], tokens[role] = create_user(f'replay-{role.lower().replace(" ", "-")}', *groups)
+        customer = users.get('Customer') or create_user('replay-customer', 'Customer')[0]
+
+        menu_ids = list(MenuItem.objects.order_by('id').values_list('id', flat=True)[:10])
+        for menu_id in menu_ids:
+            order = Order.objects.create(user=customer, delivery_crew=users.get('Delivery Crew'),
+                                         total='11.00', date=date.today())
+            OrderItem.objects.create(order=order, menuitem_id=menu_id, quantity=2, unit_price='5.50', price='11.00')
+        Cart.objects.add_items(customer, dict.fromkeys(menu_ids[:3], 1))
+        return tokens
+
+    def client_sender(self, tokens):
+        local = threading.local()
+
+        def send(entry):
+            if not hasattr(local, 'clients'):
+                local.clients = {}
+            client = local.clients.get(entry['role'])
+            if client is None:
+                token = tokens.get(entry['role'])
+                client = local.clients[entry['role']] = (
+                    Client(HTTP_AUTHORIZATION=f'Token {token}') if token else Client()
+                )
+            kwargs = {}
+            if entry.get('body') is not None:
+                kwargs = {'data': json.dumps(entry['body']), 'content_type': 'application/json'}
+            return client.generic(entry['method'], entry['path'], **kwargs).status_code
+        return send
+
+    def http_sender(self, base_url, tokens):
+        def send(entry):
+            headers = {}
+            if tokens.get(entry['role']):
+                headers['Authorization'] = f"Token {tokens[entry['role']]}"
+            data = None
+            if entry.get('body') is not None:
+                data = json.dumps(entry['body']).encode()
+                headers['Content-Type'] = 'application/json'
+            request = urllib.request.Request(base_url + entry['path'], data=data, headers=headers,
+                                             method=entry['method'])
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return send
+
+    def replay(self, traffic, concurrency, send, count_queries):
+        """
+        Sends the traffic from `concurrency` threads and returns
+        ({endpoint: [(seconds, queries, status)]}, wall clock seconds)
+        """
+        results = defaultdict(list)
+        pending = iter(traffic)
+        lock = threading.Lock()
+
+        def worker():
+            timer = StatementTimer()
+            try:
+                with ExitStack() as stack:
+                    for alias in connections:
+                        stack.enter_context(connections[alias].execute_wrapper(timer))
+                    while True:
+                        with lock:
+                            entry = next(pending, None)
+                        if entry is None:
+                            return
+                        queries_before = timer.count
+                        start = time.perf_counter()
+                        status = send(entry)
+                        elapsed = time.perf_counter() - start
+                        queries = timer.count - queries_before if count_queries else None
+                        with lock:
+                            results[endpoint_of(entry)].append((elapsed, queries, status))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    def report(self, results, elapsed):
+        total = sum(len(samples) for samples in results.values())
+        report = {'requests': total, 'rps': total / elapsed, 'endpoints': {}}
+
+        self.stdout.write(f"{'endpoint':<40} {'n':>5} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'queries':>8}")
+        for endpoint, samples in sorted(results.items()):
+            latencies = [seconds * 1000 for seconds, _, _ in samples]
+            queries = [count for _, count, _ in samples if count is not None]
+            stats = {
+                'count': len(samples),
+                'errors': sum(1 for _, _, status in samples if status >= 500),
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'queries': sum(queries) / len(queries) if queries else None,
+            }
+            report['endpoints'][endpoint] = stats
+            self.stdout.write(
+                f"{endpoint:<40} {stats['count']:>5} {stats['errors']:>6} {stats['p50']:>8.2f} "
+                f"{stats['p95']:>8.2f} {stats['p99']:>8.2f} "
+                f"{'-' if stats['queries'] is None else format(stats['queries'], '.1f'):>8}"
+            )
+        self.stdout.write(f"{total} requests in {elapsed:.2f}s, {report['rps']:.1f} requests/sec")
+        return report
+
+    def compare(self, report, baseline, tolerance):
+        regressions = []
+        if report['rps'] < baseline['rps'] * (1 - tolerance):
+            regressions.append(f"requests/sec {report['rps']:.1f} < {baseline['rps']:.1f}")
+
+        for endpoint, stats in report['endpoints'].items():
+            before = baseline['endpoints'].get(endpoint)
+            if before is None:
+                continue
+            # 1ms of slack so that sub-millisecond endpoints don't fail on noise
+            if stats['p95'] > before['p95'] * (1 + tolerance) + 1:
+                regressions.append(f"{endpoint}: p95 {stats['p95']:.2f}ms > {before['p95']:.2f}ms")
+            if stats['queries'] is not None and before['queries'] is not None \
+                    and stats['queries'] > before['queries'] + 0.1:
+                regressions.append(f"{endpoint}: {stats['queries']:.1f} queries > {before['queries']:.1f}")
+            if stats['errors'] > before['errors']:
+                regressions.append(f"{endpoint}: {stats['errors']} server errors > {before['errors']}")
+        return regressions
+
+
+_routes = {}
+
+
+def endpoint_of(entry):
+    """
+    'GET api/orders/<int:orderId>' for a recorded GET /api/orders/12?page=2
+    """
+    path = urlsplit(entry['path']).path
+    route = _routes.get(path)
+    if route is None:
+        try:
+            route = resolve(path).route
+        except Resolver404:
+            route = path
+        _routes[path] = route
+    return f"{entry['method']} {route}"
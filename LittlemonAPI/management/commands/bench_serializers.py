@@ -0,0 +1,75 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from LittlemonAPI.fast_serializers import menu_item_reader, cart_reader, order_reader
+from LittlemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from LittlemonAPI.serializers import MenuItemSerializer, CartSerializer, OrderSerializer
+from LittlemonAPI.views import orders_with_items
+from ._bench import benchmark_database, create_user
+
+
+class Command(BaseCommand):
+    help = "Compares the DRF serializers with the compiled read path (output has to be byte-identical)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per listing")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with benchmark_database():
+            user = self.populate(rows)
+            cases = [
+                ('menu items', MenuItemSerializer, menu_item_reader,
+                 lambda: MenuItem.objects.select_related('category').order_by('id')),
+                ('cart', CartSerializer, cart_reader,
+                 lambda: Cart.objects.filter(user=user).select_related('user', 'menuitem__category').order_by('id')),
+                ('orders', OrderSerializer, order_reader,
+                 lambda: orders_with_items().order_by('id')),
+            ]
+
+            renderer = JSONRenderer()
+            self.stdout.write(f"{'listing':<12} {'serializer ms':>14} {'compiled ms':>12} {'speedup':>8}")
+            for name, serializer_class, reader, queryset in cases:
+                slow, slow_output = self.measure(
+                    lambda: renderer.render(serializer_class(queryset(), many=True).data), options['repeat'])
+                fast, fast_output = self.measure(
+                    lambda: renderer.render(reader.render(reader.values(queryset()))), options['repeat'])
+                if slow_output != fast_output:
+                    raise CommandError(f"{name}: the compiled output differs from {serializer_class.__name__}")
+                self.stdout.write(f"{name:<12} {slow * 1000:>14.2f} {fast * 1000:>12.2f} {slow / fast:>7.1f}x")
+
+    def measure(self, render, repeat):
+        best, output = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def populate(self, rows):
+        category = Category.objects.create(title='Bench')
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Bench item {i}', price=f'{i % 90 + 1}.25', featured=i % 3 == 0, category=category)
+            for i in range(rows)
+        )
+        menu_ids = list(MenuItem.objects.values_list('id', flat=True))
+        user, _ = create_user('bench-customer', 'Customer')
+        crew, _ = create_user('bench-crew', 'Delivery Crew')
+
+        Cart.objects.add_items(user, {menu_id: 2 for menu_id in menu_ids})
+        orders = Order.objects.bulk_create(
+            Order(user=user, delivery_crew=crew if i % 2 else None, status=i % 4 == 0,
+                  total='13.50', date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 300))
+            for i in range(rows)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, menuitem_id=menu_ids[(order.pk + line) % len(menu_ids)],
+                      quantity=line + 1, unit_price='4.50', price=f'{4.5 * (line + 1):.2f}')
+            for order in orders for line in range(3)
+        )
+        return user
@@ -0,0 +1,156 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from LittlemonAPI.models import Category, MenuItem, Order, OrderItem
+from ._bench import benchmark_database, create_user, percentile
+
+# What the project ran with before the SQLite tuning: rollback journal,
+# sqlite3's default 5s busy handler, one connection per request, deferred
+# transactions and every query on default
+BEFORE = {
+    'SQLITE_PRAGMAS': {},
+    'DATABASE_ROUTERS': [],
+}
+
+
+@contextmanager
+def untuned_sqlite():
+    default = connections.settings['default']
+    saved = {key: default[key] for key in ('CONN_MAX_AGE', 'OPTIONS')}
+    connections.close_all()
+    default['CONN_MAX_AGE'] = 0
+    default['OPTIONS'] = {key: value for key, value in default['OPTIONS'].items() if key != 'transaction_mode'}
+    try:
+        with override_settings(**BEFORE):
+            # The journal mode is stored in the file, switch it back once
+            with connections['default'].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+            connections.close_all()
+            yield
+    finally:
+        connections.close_all()
+        default.update(saved)
+
+
+class Command(BaseCommand):
+    help = ("Mixed read/write load (menu and order GETs while customers check out) with the original "
+            "SQLite setup and the tuned one (WAL, pragmas, persistent connections, read replica)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Threads sending GETs")
+        parser.add_argument('--writers', type=int, default=4, help="Threads checking out, one customer each")
+        parser.add_argument('--reads', type=int, default=300, help="GETs per reader")
+        parser.add_argument('--checkouts', type=int, default=30, help="Checkouts per writer")
+        parser.add_argument('--menu-items', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=2000, help="Orders in the database before the run")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':<8} {'reads/s':>8} {'read p50':>9} {'read p95':>9} "
+                          f"{'checkouts/s':>12} {'checkout p95':>13} {'errors':>7}")
+        for name, profile in (('before', untuned_sqlite), ('after', nullcontext)):
+            # A fresh database each, so both runs start from the same data
+            with benchmark_database():
+                tokens, menu_ids = self.populate(options['menu_items'], options['orders'], options['writers'])
+                # Server errors ("database is locked") are counted below rather than logged
+                logging.disable(logging.ERROR)
+                try:
+                    with profile():
+                        results, elapsed = self.run(tokens, menu_ids, options)
+                finally:
+                    logging.disable(logging.NOTSET)
+            reads, checkouts, errors = results['read'], results['checkout'], results['errors']
+            self.stdout.write(
+                f"{name:<8} {len(reads) / elapsed:>8.0f} {percentile(reads, 50):>7.1f}ms "
+                f"{percentile(reads, 95):>7.1f}ms {len(checkouts) / elapsed:>12.1f} "
+                f"{percentile(checkouts, 95):>11.1f}ms {errors:>7}"
+            )
+
+    def populate(self, menu_items, orders, writers):
+        category = Category.objects.create(title='Bench', slug='bench')
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Bench item {i}', price='4.50', category=category) for i in range(menu_items)
+        )
+        menu_ids = list(MenuItem.objects.order_by('id').values_list('id', flat=True))
+
+        customer, customer_token = create_user('bench-customer', 'Customer')
+        manager_token = create_user('bench-manager', 'Manager')[1]
+        for start in range(0, orders, 500):
+            created = Order.objects.bulk_create(
+                Order(user=customer, total='9.00', date=date.today()) for _ in range(min(500, orders - start))
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, menuitem_id=menu_ids[order.pk % len(menu_ids)], quantity=2,
+                          unit_price='4.50', price='9.00') for order in created
+            )
+        return {
+            'Customer': customer_token,
+            'Manager': manager_token,
+            'writers': [create_user(f'bench-writer-{i}', 'Customer')[1] for i in range(writers)],
+        }, menu_ids
+
+    def run(self, tokens, menu_ids, options):
+        results = {'read': [], 'checkout': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def timed(kind, send):
+            start = time.perf_counter()
+            try:
+                failed = any(response.status_code >= 500 for response in send())
+            except Exception:
+                failed = True
+            elapsed = (time.perf_counter() - start) * 1000
+            # What the request handler does at the end of each request (CONN_MAX_AGE)
+            close_old_connections()
+            with lock:
+                if failed:
+                    results['errors'] += 1
+                else:
+                    results[kind].append(elapsed)
+
+        def reader(seed):
+            rng = random.Random(seed)
+            customer = Client(HTTP_AUTHORIZATION=f"Token {tokens['Customer']}", raise_request_exception=False)
+            manager = Client(HTTP_AUTHORIZATION=f"Token {tokens['Manager']}", raise_request_exception=False)
+            try:
+                for _ in range(options['reads']):
+                    choice = rng.random()
+                    if choice < 0.5:
+                        url, client = f'/api/menu-items/{rng.choice(menu_ids)}', customer
+                    elif choice < 0.8:
+                        url, client = '/api/orders/?page_size=20', manager
+                    else:
+                        url, client = '/api/orders/?page_size=20', customer
+                    timed('read', lambda: [client.get(url)])
+            finally:
+                connections.close_all()
+
+        def writer(seed, token):
+            rng = random.Random(seed)
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}', raise_request_exception=False)
+            try:
+                for _ in range(options['checkouts']):
+                    items = [{'menuitem_id': menu_id, 'quantity': 1} for menu_id in rng.sample(menu_ids, 3)]
+                    timed('checkout', lambda: [
+                        client.post('/api/cart/menu-items/', items, content_type='application/json'),
+                        client.post('/api/orders/'),
+                    ])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i, token)) for i, token in enumerate(tokens['writers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from LittlemonAPI.menu_io import FORMATS, export_menu
+
+
+class Command(BaseCommand):
+    help = "Streams the whole menu as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write (stdout by default)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for text in export_menu(options['fmt'], options['chunk_size']):
+                output.write(text)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,30 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from LittlemonAPI.order_export import FORMATS, export_orders
+
+
+class Command(BaseCommand):
+    help = "Streams the live and archived orders, with their items, as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="First date (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Last date (YYYY-MM-DD)")
+        parser.add_argument('--status', choices=('0', '1'), help="0 for the pending orders, 1 for the delivered ones")
+        parser.add_argument('--output', help="File to write (stdout by default)")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Orders per query")
+
+    def handle(self, *args, **options):
+        delivered = None if options['status'] is None else options['status'] == '1'
+        rows = export_orders(options['fmt'], options['chunk_size'], date_from=options['date_from'],
+                             date_to=options['date_to'], delivered=delivered)
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for text in rows:
+                output.write(text)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlemonAPI.menu_io import FORMATS, import_menu
+
+
+class Command(BaseCommand):
+    help = "Imports menu items from a CSV or NDJSON file (titles that already exist are updated)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', dest='fmt', choices=FORMATS,
+                            help="Defaults to the file extension (csv otherwise)")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+        start = time.perf_counter()
+        try:
+            if path == '-':
+                summary = import_menu(sys.stdin, fmt, options['chunk_size'])
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    summary = import_menu(stream, fmt, options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['created']} created, {summary['updated']} updated, "
+            f"{summary['categories_created']} categories created, "
+            f"{len(summary['errors'])} rejected in {elapsed:.2f}s"
+        ))
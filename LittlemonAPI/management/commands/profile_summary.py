@@ -0,0 +1,48 @@
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlemonAPI.middleware import profile_dir
+
+
+class Command(BaseCommand):
+    help = "Summarizes the hottest functions across the profiles captured by ProfilerMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--route', help="Only profiles whose route contains this text, e.g. api_orders")
+        parser.add_argument('--method', help="Only profiles of this HTTP method")
+        parser.add_argument('--sort', choices=['tottime', 'cumulative', 'ncalls'], default='tottime')
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--dir', help="Profile directory (defaults to PROFILER_DIR)")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profile_dir()
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+        except FileNotFoundError:
+            raise CommandError(f"No profiles in {directory}")
+
+        selected = []
+        for name in names:
+            # <time_ns>-<pid>-<method>-<route>.prof
+            _, _, method, route = name[:-len('.prof')].split('-', 3)
+            if options['method'] and method != options['method'].upper():
+                continue
+            if options['route'] and options['route'] not in route:
+                continue
+            selected.append((name, f'{method} {route}'))
+        if not selected:
+            raise CommandError("No profile matches")
+
+        for request, count in Counter(request for _, request in selected).most_common():
+            self.stdout.write(f"{count:>5}  {request}")
+        self.stdout.write("")
+
+        # OutputWrapper ends every write() with a newline, pstats writes in pieces
+        output = io.StringIO()
+        stats = pstats.Stats(*(os.path.join(directory, name) for name, _ in selected), stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
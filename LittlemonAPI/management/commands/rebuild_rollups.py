@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittlemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the sales rollups behind /api/analytics/sales from the orders "
+            "(after loading orders in bulk, or if they ever drift)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = rebuild_rollups()
+        details = ', '.join(f"{count} {model._meta.verbose_name_plural}" for model, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"{details} in {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,182 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from LittlemonAPI.menu_cache import bump_menu_version
+from LittlemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from LittlemonAPI.rollups import rebuild_rollups
+
+# A fixed date rather than today, so that the same seed gives the same data on any day
+DEFAULT_UNTIL = date(2025, 1, 1)
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with deterministic synthetic data (categories, menu items, users, carts, orders) "
+            "for benchmarks; rows are added after the existing ones")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help="Same seed, same data")
+        parser.add_argument('--categories', type=int, default=300)
+        parser.add_argument('--menu-items', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=20_000, help="Users in total, managers and crew included")
+        parser.add_argument('--managers', type=int, default=20)
+        parser.add_argument('--delivery-crew', type=int, default=500)
+        parser.add_argument('--carts', type=int, default=5_000, help="Customers with a cart")
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--max-items-per-order', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365, help="Orders are spread over this many days")
+        parser.add_argument('--until', type=date.fromisoformat, default=DEFAULT_UNTIL,
+                            help=f"Date of the most recent orders (YYYY-MM-DD, default {DEFAULT_UNTIL})")
+        parser.add_argument('--password', default='littlemon', help="Password of every seeded user")
+        parser.add_argument('--chunk-size', type=int, default=20_000, help="Rows per transaction")
+
+    def handle(self, *args, **options):
+        if options['managers'] + options['delivery_crew'] >= options['users']:
+            raise CommandError("--users should leave room for customers")
+        if options['menu_items'] < options['max_items_per_order']:
+            raise CommandError("--menu-items should be at least --max-items-per-order")
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.totals = []
+        start = time.perf_counter()
+
+        categories = self.seed_categories(options['categories'])
+        prices = self.seed_menu_items(options['menu_items'], categories)
+        managers, crew, customers = self.seed_users(options)
+        self.seed_carts(customers[:options['carts']], prices)
+        self.seed_orders(options, customers, crew, prices)
+        bump_menu_version()
+        self.rebuild_rollups()
+
+        elapsed = time.perf_counter() - start
+        rows = sum(count for _, count, _ in self.totals)
+        self.stdout.write(self.style.SUCCESS(f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/sec)"))
+
+    def insert(self, label, models, chunks):
+        """
+        Writes an iterable of {model: [instances]} chunks, one transaction
+        per chunk, and reports rows/sec per model
+        """
+        counts = dict.fromkeys(models, 0)
+        start = time.perf_counter()
+        for chunk in chunks:
+            with transaction.atomic():
+                for model, rows in chunk.items():
+                    model.objects.bulk_create(rows)
+                    counts[model] += len(rows)
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.totals.append((label, rows, elapsed))
+        details = ', '.join(f"{count} {model._meta.verbose_name_plural}" for model, count in counts.items())
+        self.stdout.write(f"{label:<12} {details} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/sec)")
+
+    def rebuild_rollups(self):
+        # bulk_create bypasses the order views that keep the sales rollups up to date
+        start = time.perf_counter()
+        rows = sum(rebuild_rollups().values())
+        self.stdout.write(f"{'rollups':<12} {rows} rows rebuilt in {time.perf_counter() - start:.1f}s")
+
+    def chunks(self, instances, model):
+        iterator = iter(instances)
+        while chunk := list(islice(iterator, self.chunk_size)):
+            yield {model: chunk}
+
+    def seed_categories(self, count):
+        first = next_id(Category)
+        ids = list(range(first, first + count))
+        self.insert('categories', [Category], self.chunks(
+            (Category(id=pk, slug=f'seed-category-{pk}', title=f'Seed category {pk}') for pk in ids), Category
+        ))
+        return ids
+
+    def seed_menu_items(self, count, categories):
+        """
+        Returns {menu item id: price}
+        """
+        first = next_id(MenuItem)
+        prices = {pk: Decimal(self.rng.randrange(250, 4000)).scaleb(-2) for pk in range(first, first + count)}
+        self.insert('menu items', [MenuItem], self.chunks(
+            (MenuItem(id=pk, title=f'Seed item {pk}', price=price, featured=self.rng.random() < 0.05,
+                      category_id=self.rng.choice(categories)) for pk, price in prices.items()),
+            MenuItem,
+        ))
+        return prices
+
+    def seed_users(self, options):
+        # Hashing is the slow part of creating users, every seeded user shares one hash
+        password = make_password(options['password'])
+        first = next_id(User)
+        ids = list(range(first, first + options['users']))
+        managers = ids[:options['managers']]
+        crew = ids[len(managers):len(managers) + options['delivery_crew']]
+        customers = ids[len(managers) + len(crew):]
+
+        groups = {name: Group.objects.get_or_create(name=name)[0].id
+                  for name in ('Manager', 'Delivery Crew', 'Customer')}
+        group_of = {pk: groups['Manager'] for pk in managers}
+        group_of.update((pk, groups['Delivery Crew']) for pk in crew)
+        group_of.update((pk, groups['Customer']) for pk in customers)
+        Membership = User.groups.through
+
+        def chunks():
+            for chunk in self.chunks((User(id=pk, username=f'seed-{pk}', email=f'seed-{pk}@littlemon.test',
+                                           password=password) for pk in ids), User):
+                chunk[Membership] = [Membership(user_id=user.id, group_id=group_of[user.id]) for user in chunk[User]]
+                yield chunk
+
+        self.insert('users', [User, Membership], chunks())
+        return managers, crew, customers
+
+    def seed_carts(self, customers, prices):
+        menu_ids = list(prices)
+
+        def lines():
+            for user_id in customers:
+                # sample() keeps (menuitem, user) unique
+                for menu_id in self.rng.sample(menu_ids, self.rng.randint(1, 4)):
+                    quantity = self.rng.randint(1, 3)
+                    yield Cart(user_id=user_id, menuitem_id=menu_id, quantity=quantity,
+                               unit_price=prices[menu_id], price=prices[menu_id] * quantity)
+
+        self.insert('carts', [Cart], self.chunks(lines(), Cart))
+
+    def seed_orders(self, options, customers, crew, prices):
+        menu_ids = list(prices)
+        first = next_id(Order)
+        oldest = options['until'] - timedelta(days=options['days'] - 1)
+        orders_per_chunk = max(1, self.chunk_size // (options['max_items_per_order'] + 1))
+
+        def chunks():
+            for low in range(first, first + options['orders'], orders_per_chunk):
+                orders, items = [], []
+                for pk in range(low, min(low + orders_per_chunk, first + options['orders'])):
+                    total = Decimal(0)
+                    # sample() keeps (order, menuitem) unique
+                    for menu_id in self.rng.sample(menu_ids, self.rng.randint(1, options['max_items_per_order'])):
+                        quantity = self.rng.randint(1, 3)
+                        price = prices[menu_id] * quantity
+                        total += price
+                        items.append(OrderItem(order_id=pk, menuitem_id=menu_id, quantity=quantity,
+                                               unit_price=prices[menu_id], price=price))
+                    delivered = self.rng.random() < 0.7
+                    orders.append(Order(
+                        id=pk, user_id=self.rng.choice(customers), total=total, status=delivered,
+                        delivery_crew_id=self.rng.choice(crew) if crew and (delivered or self.rng.random() < 0.5) else None,
+                        date=oldest + timedelta(days=self.rng.randrange(options['days'])),
+                    ))
+                yield {Order: orders, OrderItem: items}
+
+        self.insert('orders', [Order, OrderItem], chunks())
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
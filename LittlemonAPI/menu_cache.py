@@ -0,0 +1,62 @@
+"""
+In-process cache for the menu catalog served by GET /api/menu-items/.
+
+Every cached page is keyed by the global menu version. The version lives
+in a small marker file so that all worker processes on the host see a
+bump as soon as one of them writes to the menu, without a database query.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .utils import FileVersionMarker
+
+
+class MenuCatalogCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.marker = FileVersionMarker('MENU_CACHE_VERSION_FILE', 'littlemon-menu.version')
+        self._entries = OrderedDict()
+        self._seen_version = None
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self.marker.version()
+
+    def bump(self):
+        self.marker.bump()
+        with self._lock:
+            self._entries.clear()
+
+    def etag(self, version, key):
+        digest = hashlib.sha1(f'{version}|{key}'.encode()).hexdigest()
+        return f'"{digest}"'
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self._seen_version:
+                # Another process bumped the version: drop our stale pages.
+                self._entries.clear()
+                self._seen_version = version
+            data = self._entries.get((version, key))
+            if data is not None:
+                self._entries.move_to_end((version, key))
+            return data
+
+    def set(self, version, key, data):
+        with self._lock:
+            if version != self._seen_version:
+                return
+            self._entries[(version, key)] = data
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+menu_catalog = MenuCatalogCache(getattr(settings, 'MENU_CACHE_MAX_ENTRIES', 256))
+
+
+def bump_menu_version():
+    menu_catalog.bump()
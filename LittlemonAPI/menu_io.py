@@ -0,0 +1,169 @@
+"""
+Streaming bulk import and export of the menu (CSV or NDJSON).
+
+Rows are processed in chunks: each chunk resolves its categories and its
+existing titles with one set-based query each, then writes with
+bulk_create / bulk_update inside its own transaction. Titles are unique,
+so importing a title that already exists updates that menu item.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .menu_cache import bump_menu_version
+from .models import Category, MenuItem
+
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ['title', 'price', 'featured', 'category_slug', 'category_title']
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+MAX_PRICE = Decimal('9999.99')
+
+
+def read_rows(stream, fmt):
+    """
+    Yields (line number, row dict or error message) from a text stream
+    """
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, row
+    else:
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"Invalid JSON: {e}"
+                continue
+            yield line_no, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def clean_row(row):
+    """
+    Validates a raw row the way MenuItemSerializer would and returns the
+    values to store. Raises ValueError with a readable message.
+    """
+    title = str(row.get('title') or '').strip()
+    if not 2 <= len(title) <= 255:
+        raise ValueError("title should be between 2 and 255 characters")
+
+    try:
+        price = Decimal(str(row.get('price')))
+        # NaN would only fail in the range check below, outside this try
+        if not price.is_finite():
+            raise InvalidOperation
+        price = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError("price should be a decimal number")
+    if not Decimal('0.01') <= price <= MAX_PRICE:
+        raise ValueError(f"price should be between 0.01 and {MAX_PRICE}")
+
+    featured = row.get('featured', False)
+    if isinstance(featured, str):
+        featured = featured.strip().lower() in ('1', 'true', 'yes')
+
+    category_title = str(row.get('category_title') or '').strip()
+    category_slug = slugify(row.get('category_slug') or category_title)
+    if not category_slug:
+        raise ValueError("category_slug or category_title is required")
+
+    return {
+        'title': title,
+        'price': price,
+        'featured': bool(featured),
+        'category_slug': category_slug,
+        'category_title': category_title or category_slug.replace('-', ' ').title(),
+    }
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@transaction.atomic
+def _import_chunk(rows, summary):
+    # Later rows win when a title appears twice in the same chunk
+    rows = {row['title']: row for row in rows}
+
+    categories = {}
+    slugs = {row['category_slug']: row['category_title'] for row in rows.values()}
+    for slug, category_id in Category.objects.filter(slug__in=slugs).order_by('-id').values_list('slug', 'id'):
+        categories[slug] = category_id
+    new_categories = Category.objects.bulk_create(
+        Category(slug=slug, title=title) for slug, title in slugs.items() if slug not in categories
+    )
+    categories.update((category.slug, category.id) for category in new_categories)
+    summary['categories_created'] += len(new_categories)
+
+    existing = {item.title: item for item in MenuItem.objects.filter(title__in=list(rows)).only('id', 'title')}
+    to_create, to_update = [], []
+    for title, row in rows.items():
+        item = existing.get(title) or MenuItem(title=title)
+        item.price = row['price']
+        item.featured = row['featured']
+        item.category_id = categories[row['category_slug']]
+        (to_update if item.pk else to_create).append(item)
+
+    MenuItem.objects.bulk_create(to_create)
+    MenuItem.objects.bulk_update(to_update, ['price', 'featured', 'category'])
+    summary['created'] += len(to_create)
+    summary['updated'] += len(to_update)
+
+    # bulk_create / bulk_update don't send the signals the catalog cache
+    # listens to. Each chunk commits on its own, so an import that fails
+    # halfway must still invalidate the chunks it wrote.
+    transaction.on_commit(bump_menu_version)
+
+
+def import_menu(stream, fmt='csv', chunk_size=500):
+    """
+    Imports menu items from a text stream and returns a summary
+    {created, updated, categories_created, errors}.
+    """
+    summary = {'created': 0, 'updated': 0, 'categories_created': 0, 'errors': []}
+
+    def valid_rows():
+        for line_no, row in read_rows(stream, fmt):
+            try:
+                if isinstance(row, str):
+                    raise ValueError(row)
+                yield clean_row(row)
+            except ValueError as e:
+                summary['errors'].append({'line': line_no, 'error': str(e)})
+
+    for chunk in _chunks(valid_rows(), chunk_size):
+        _import_chunk(chunk, summary)
+    return summary
+
+
+def export_menu(fmt='csv', chunk_size=2000):
+    """
+    Yields the menu as CSV or NDJSON text, reading the menu items in chunks
+    """
+    rows = (
+        MenuItem.objects.order_by('id')
+        .values_list('title', 'price', 'featured', 'category__slug', 'category__title')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(COLUMNS, row)), default=str) + '\n'
@@ -0,0 +1,291 @@
+"""
+Per-request performance metrics, exposed in Prometheus text format.
+
+Every request is timed by phase (auth, permissions, throttle, db,
+serialization, render and total) into fixed-bucket histograms keyed by
+route and method. Each thread records into its own shard, so the hot path
+takes no lock; shards are merged when the metrics are read. Each worker
+process periodically writes its merged histograms to METRICS_DIR so that
+/api/metrics can add up every worker on the host. A worker's counts
+leave the totals when it exits, which Prometheus reads as a counter reset.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('total', 'auth', 'permissions', 'throttle', 'db', 'serialization', 'render')
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'littlemon-metrics'))
+
+
+class MetricsRegistry:
+    def __init__(self, flush_interval=5.0):
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._extra_counters = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {'histograms': {}, 'counters': {}}
+            # Only taken once per thread
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, key, seconds):
+        histograms = self._shard()['histograms']
+        histogram = histograms.get(key)
+        if histogram is None:
+            # bucket counts (the last one is +Inf), then sum
+            histogram = histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+    def increment(self, key, amount=1):
+        counters = self._shard()['counters']
+        counters[key] = counters.get(key, 0) + amount
+
+    def register_counters(self, collect):
+        """
+        Adds a callable returning {name: value} read at snapshot time
+        """
+        self._extra_counters.append(collect)
+
+    def snapshot(self):
+        merged = {'histograms': {}, 'counters': {}}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            _merge(merged, {
+                'histograms': {key: list(value) for key, value in list(shard['histograms'].items())},
+                'counters': dict(list(shard['counters'].items())),
+            })
+        for collect in self._extra_counters:
+            _merge(merged, {'histograms': {}, 'counters': {(name,): value for name, value in collect().items()}})
+        return merged
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        self.flush()
+
+    def flush(self):
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        snapshot = self.snapshot()
+        payload = {
+            'histograms': [[list(key), value] for key, value in snapshot['histograms'].items()],
+            'counters': [[list(key), value] for key, value in snapshot['counters'].items()],
+        }
+        with open(f'{path}.tmp', 'w') as output:
+            json.dump(payload, output)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """
+        This process's live metrics plus the last flush of every other worker
+        still running (the files of the workers that exited are deleted)
+        """
+        merged = self.snapshot()
+        directory = metrics_dir()
+        own = f'{os.getpid()}.json'
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith('.json') and name != own]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            pid = name[:-len('.json')]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(os.path.join(directory, name)) as source:
+                    payload = json.load(source)
+            except (OSError, ValueError):
+                continue
+            _merge(merged, {
+                'histograms': {tuple(key): value for key, value in payload['histograms']},
+                'counters': {tuple(key): value for key, value in payload['counters']},
+            })
+        return merged
+
+
+def _process_alive(pid):
+    if os.name != 'posix':
+        # Signal 0 only probes on POSIX
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Another user's process
+        return True
+    return True
+
+
+def _merge(into, other):
+    for key, value in other['histograms'].items():
+        current = into['histograms'].get(key)
+        if current is None:
+            into['histograms'][key] = list(value)
+        else:
+            for index, count in enumerate(value):
+                current[index] += count
+    for key, value in other['counters'].items():
+        into['counters'][key] = into['counters'].get(key, 0) + value
+
+
+registry = MetricsRegistry(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0))
+
+
+class RequestMetrics:
+    """
+    Phase timings of the request being served, filled by the middleware,
+    the database wrapper and InstrumentedViewMixin
+    """
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.phases['db'] += time.perf_counter() - start
+            self.queries += 1
+
+    def record(self, route, method):
+        for phase, seconds in self.phases.items():
+            if seconds or phase in ('total', 'db'):
+                registry.observe((route, method, phase), seconds)
+        registry.increment(('db_queries', route, method), self.queries)
+        registry.increment(('requests', route, method))
+
+
+def get_request_metrics(request):
+    # DRF's Request wraps the HttpRequest the middleware annotated
+    return getattr(getattr(request, '_request', request), '_metrics', None)
+
+
+@contextmanager
+def timed(request, phase):
+    metrics = get_request_metrics(request)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[phase] += time.perf_counter() - start
+
+
+@contextmanager
+def timed_handler(request):
+    """
+    Times a view handler as serialization, leaving out its queries and
+    the rendering it does itself
+    """
+    metrics = get_request_metrics(request)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    excluded = metrics.phases['db'] + metrics.phases['render']
+    try:
+        yield
+    finally:
+        handler = time.perf_counter() - start
+        excluded = metrics.phases['db'] + metrics.phases['render'] - excluded
+        metrics.phases['serialization'] += max(0.0, handler - excluded)
+
+
+class InstrumentedViewMixin:
+    """
+    Splits the time DRF spends in a view into auth, permissions, throttle
+    and serialization (handler time minus the queries it ran)
+    """
+    def perform_authentication(self, request):
+        with timed(request, 'auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with timed(request, 'permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with timed(request, 'permissions'):
+            super().check_object_permissions(request, obj)
+
+    def check_throttles(self, request):
+        with timed(request, 'throttle'):
+            super().check_throttles(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        metrics = get_request_metrics(request)
+        if metrics is not None:
+            self._handler_started = (time.perf_counter(), metrics.phases['db'])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics = get_request_metrics(request)
+        started = getattr(self, '_handler_started', None)
+        if metrics is not None and started is not None:
+            start, db_before = started
+            handler = time.perf_counter() - start
+            metrics.phases['serialization'] += max(0.0, handler - (metrics.phases['db'] - db_before))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def render_prometheus(snapshot):
+    lines = [
+        '# HELP littlemon_request_phase_seconds Time spent per request phase',
+        '# TYPE littlemon_request_phase_seconds histogram',
+    ]
+    for (route, method, phase), value in sorted(snapshot['histograms'].items()):
+        labels = f'route="{_escape(route)}",method="{method}",phase="{phase}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), value[:-1]):
+            cumulative += count
+            lines.append(f'littlemon_request_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'littlemon_request_phase_seconds_sum{{{labels}}} {value[-1]:.6f}')
+        lines.append(f'littlemon_request_phase_seconds_count{{{labels}}} {cumulative}')
+
+    per_route = {'requests': 'littlemon_requests_total', 'db_queries': 'littlemon_db_queries_total'}
+    for kind, metric in per_route.items():
+        lines.append(f'# TYPE {metric} counter')
+        for key, value in sorted(snapshot['counters'].items()):
+            if key[0] == kind:
+                lines.append(f'{metric}{{route="{_escape(key[1])}",method="{key[2]}"}} {value}')
+
+    for key, value in sorted(snapshot['counters'].items()):
+        if len(key) == 1:
+            lines.append(f'# TYPE littlemon_{key[0]} counter')
+            lines.append(f'littlemon_{key[0]} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,226 @@
+import cProfile
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import response_for_exception
+from django.db import connections
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .metrics import RequestMetrics, registry
+from .utils import get_user_roles
+
+
+class MetricsMiddleware:
+    """
+    Times every request and the queries it runs, then records the phases
+    under the route pattern it resolved to (see metrics.py)
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request) as metrics, self.wrap_queries(metrics):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.measure(request) as metrics:
+            # The connections are per thread and the ORM runs in the thread
+            # sync_to_async gives this request, not in the event loop's
+            stack = await sync_to_async(self.wrap_queries)(metrics)
+            try:
+                return await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+
+    def wrap_queries(self, metrics):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    @contextmanager
+    def measure(self, request):
+        metrics = request._metrics = RequestMetrics()
+        start = time.perf_counter()
+        yield metrics
+        metrics.phases['total'] = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        metrics.record(match.route if match else '<unmatched>', request.method)
+        registry.maybe_flush()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns
+        metrics = request._metrics
+        start = time.perf_counter()
+
+        def rendered(response):
+            metrics.phases['render'] += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Runs the view under cProfile when a manager sends the PROFILER_HEADER
+    header or when the request is picked by PROFILER_SAMPLE_RATE. Profiles
+    are written as pstats files to PROFILER_DIR, which keeps the newest
+    PROFILER_MAX_FILES of them (see manage.py profile_summary).
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.header = getattr(settings, 'PROFILER_HEADER', 'HTTP_X_PROFILE')
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func):
+            # cProfile only follows the calling thread, not coroutines
+            return None
+        requested = request.META.get(self.header) == '1' and self.is_manager(request)
+        if not requested and not (self.sample_rate and random.random() < self.sample_rate):
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        except Exception as exc:
+            # Django only turns the exceptions into responses for the views it calls itself
+            response = response_for_exception(request, exc)
+
+        name = write_profile(profiler, request)
+        if requested:
+            response['X-Profile-Id'] = name
+        return response
+
+    def is_manager(self, request):
+        """
+        Authenticates the request before the view does, so that nobody
+        else can make the server profile their requests
+        """
+        # The session user of AuthenticationMiddleware, or the API credentials
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            drf_request = Request(request)
+            for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+                try:
+                    result = authentication_class().authenticate(drf_request)
+                except exceptions.APIException:
+                    return False
+                if result is not None:
+                    user = result[0]
+                    break
+        return user is not None and user.is_authenticated and 'Manager' in get_user_roles(user)
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'littlemon-profiles'))
+
+
+def write_profile(profiler, request):
+    """
+    Dumps the profile and drops the oldest ones past PROFILER_MAX_FILES
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    match = request.resolver_match
+    route = re.sub(r'\W+', '_', match.route if match else request.path).strip('_')
+    name = f'{time.time_ns()}-{os.getpid()}-{request.method}-{route}.prof'
+    profiler.dump_stats(os.path.join(directory, name))
+
+    profiles = sorted(entry for entry in os.listdir(directory) if entry.endswith('.prof'))
+    for old in profiles[:-getattr(settings, 'PROFILER_MAX_FILES', 50)]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+class TrafficRecorderMiddleware:
+    """
+    Appends every API request (method, path, role, JSON body, status) as
+    one JSON line to TRAFFIC_RECORD_PATH, for manage.py bench_replay.
+    Disabled unless that setting is set.
+    """
+    roles = ('Manager', 'Delivery Crew', 'Customer')
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.path = getattr(settings, 'TRAFFIC_RECORD_PATH', None)
+        if not self.path:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        body = self.read_body(request)
+        response = self.get_response(request)
+        self.record(request, body, response)
+        return response
+
+    async def __acall__(self, request):
+        body = self.read_body(request)
+        response = await self.get_response(request)
+        # The user may still be the lazy session user, which needs the ORM
+        await sync_to_async(self.record)(request, body, response)
+        return response
+
+    def read_body(self, request):
+        if request.path.startswith('/api/') and request.content_type == 'application/json':
+            # Read before DRF consumes the stream
+            try:
+                return json.loads(request.body or 'null')
+            except ValueError:
+                pass
+        return None
+
+    def record(self, request, body, response):
+        if not request.path.startswith('/api/'):
+            return
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            role = 'anonymous'
+        else:
+            user_roles = get_user_roles(user)
+            role = next((name for name in self.roles if name in user_roles), 'user')
+
+        line = json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'role': role,
+            'body': body,
+            'status': response.status_code,
+        }) + '\n'
+        with self.lock, open(self.path, 'a') as output:
+            output.write(line)
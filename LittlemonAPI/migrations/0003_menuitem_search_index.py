@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# The statements as they were when this migration was written: later
+# changes to LittlemonAPI/search.py must not change what it creates
+
+INDEXED_ROWS = (
+    "SELECT m.id, m.title, c.title || ' ' || c.slug "
+    "FROM LittlemonAPI_menuitem m INNER JOIN LittlemonAPI_category c ON c.id = m.category_id"
+)
+
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS LittlemonAPI_menuitem_fts USING fts5("
+    "title, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS LittlemonAPI_menuitem_fts_menuitem_insert AFTER INSERT ON LittlemonAPI_menuitem BEGIN "
+    f"INSERT INTO LittlemonAPI_menuitem_fts (rowid, title, category) {INDEXED_ROWS} WHERE m.id = new.id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS LittlemonAPI_menuitem_fts_menuitem_update "
+    "AFTER UPDATE OF title, category_id ON LittlemonAPI_menuitem BEGIN "
+    "DELETE FROM LittlemonAPI_menuitem_fts WHERE rowid = old.id; "
+    f"INSERT INTO LittlemonAPI_menuitem_fts (rowid, title, category) {INDEXED_ROWS} WHERE m.id = new.id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS LittlemonAPI_menuitem_fts_menuitem_delete AFTER DELETE ON LittlemonAPI_menuitem BEGIN "
+    "DELETE FROM LittlemonAPI_menuitem_fts WHERE rowid = old.id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS LittlemonAPI_menuitem_fts_category_update "
+    "AFTER UPDATE OF title, slug ON LittlemonAPI_category BEGIN "
+    "DELETE FROM LittlemonAPI_menuitem_fts WHERE rowid IN "
+    "(SELECT id FROM LittlemonAPI_menuitem WHERE category_id = new.id); "
+    f"INSERT INTO LittlemonAPI_menuitem_fts (rowid, title, category) {INDEXED_ROWS} WHERE m.category_id = new.id; "
+    "END",
+
+    # Fill the index with the existing menu
+    "DELETE FROM LittlemonAPI_menuitem_fts",
+    f"INSERT INTO LittlemonAPI_menuitem_fts (rowid, title, category) {INDEXED_ROWS}",
+]
+
+UNINSTALL_SQL = [
+    "DROP TRIGGER IF EXISTS LittlemonAPI_menuitem_fts_menuitem_insert",
+    "DROP TRIGGER IF EXISTS LittlemonAPI_menuitem_fts_menuitem_update",
+    "DROP TRIGGER IF EXISTS LittlemonAPI_menuitem_fts_menuitem_delete",
+    "DROP TRIGGER IF EXISTS LittlemonAPI_menuitem_fts_category_update",
+    "DROP TABLE IF EXISTS LittlemonAPI_menuitem_fts",
+]
+
+
+def execute(schema_editor, statements):
+    # FTS5 is SQLite only: other databases keep the LIKE based search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def forwards(apps, schema_editor):
+    execute(schema_editor, INSTALL_SQL)
+
+
+def backwards(apps, schema_editor):
+    execute(schema_editor, UNINSTALL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlemonAPI', '0002_alter_menuitem_featured'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
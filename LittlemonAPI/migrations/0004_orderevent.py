@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlemonAPI', '0003_menuitem_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('created', 'created'), ('assigned', 'assigned'), ('status', 'status'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=16)),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('delivery_crew_id', models.IntegerField(db_index=True, null=True)),
+                ('previous_delivery_crew_id', models.IntegerField(db_index=True, null=True)),
+                ('status', models.BooleanField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
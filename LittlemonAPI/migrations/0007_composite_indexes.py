@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlemonAPI', '0006_order_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categorysales',
+            index=models.Index(fields=['-quantity', 'category'], name='LittlemonAP_quantit_4f2a72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['title', 'price', 'id'], name='LittlemonAP_title_903338_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitemsales',
+            index=models.Index(fields=['-quantity', 'menuitem'], name='LittlemonAP_quantit_d175d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date', 'id'], name='LittlemonAP_user_id_7e3c5f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_crew', 'date', 'id'], name='LittlemonAP_deliver_097104_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', False)), fields=['date', 'id'], name='order_open_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', False)), fields=['delivery_crew'], name='order_open_crew_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:57
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def clear_sales(apps, schema_editor):
+    # The all-time totals can't be split by day: they are rebuilt below
+    for name in ('MenuItemSales', 'CategorySales'):
+        apps.get_model('LittlemonAPI', name).objects.all().delete()
+
+
+def fill_sales(apps, schema_editor):
+    MenuItemSales = apps.get_model('LittlemonAPI', 'MenuItemSales')
+    CategorySales = apps.get_model('LittlemonAPI', 'CategorySales')
+    menu_items, categories = {}, {}
+    for name in ('OrderItem', 'ArchivedOrderItem'):
+        items = apps.get_model('LittlemonAPI', name).objects.order_by()
+        for totals, key in ((menu_items, 'menuitem_id'), (categories, 'menuitem__category_id')):
+            for row in items.values('order__date', key).annotate(quantity=Sum('quantity'), revenue=Sum('price')):
+                current = totals.setdefault((row['order__date'], row[key]), {'quantity': 0, 'revenue': 0})
+                current['quantity'] += row['quantity'] or 0
+                current['revenue'] += row['revenue'] or 0
+    MenuItemSales.objects.bulk_create(
+        (MenuItemSales(date=day, menuitem_id=pk, **values) for (day, pk), values in menu_items.items()), batch_size=5000)
+    CategorySales.objects.bulk_create(
+        (CategorySales(date=day, category_id=pk, **values) for (day, pk), values in categories.items()), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlemonAPI', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_sales, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='categorysales',
+            name='LittlemonAP_quantit_4f2a72_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='menuitemsales',
+            name='LittlemonAP_quantit_d175d1_idx',
+        ),
+        migrations.AddField(
+            model_name='categorysales',
+            name='date',
+            field=models.DateField(default=datetime.date(2000, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='menuitemsales',
+            name='date',
+            field=models.DateField(default=datetime.date(2000, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='categorysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='LittlemonAPI.category'),
+        ),
+        migrations.AlterField(
+            model_name='categorysales',
+            name='quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='menuitemsales',
+            name='menuitem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='LittlemonAPI.menuitem'),
+        ),
+        migrations.AlterField(
+            model_name='menuitemsales',
+            name='quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categorysales',
+            unique_together={('date', 'category')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='menuitemsales',
+            unique_together={('date', 'menuitem')},
+        ),
+        migrations.RunPython(fill_sales, clear_sales),
+    ]
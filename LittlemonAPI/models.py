@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, connection
 from django.contrib.auth.models import User
 
 
@@ -24,10 +24,48 @@ class MenuItem(models.Model):
     featured = models.BooleanField(db_index=True, default=False)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
 
+    class Meta:
+        # The keyset ordering of GET /api/menu-items/
+        indexes = [models.Index(fields=['title', 'price', 'id'])]
+
     def __str__(self):
         return self.title
 
 
+class CartManager(models.Manager):
+    def add_items(self, user, quantities):
+        """
+        Adds {menuitem_id: quantity} to the user's cart in a single upsert.
+
+        New lines take the current menu price; existing lines are incremented
+        in the database, so concurrent adds never lose an update. Unknown
+        menu items are skipped. Returns the number of cart lines written.
+        """
+        if not quantities:
+            return 0
+
+        qn = connection.ops.quote_name
+        cart = qn(self.model._meta.db_table)
+        menu = qn(MenuItem._meta.db_table)
+        values = ', '.join(['(%s, %s)'] * len(quantities))
+        # The statement has to start with INSERT for the driver to report rowcount
+        sql = (
+            f'INSERT INTO {cart} (user_id, menuitem_id, quantity, unit_price, price) '
+            f'SELECT %s, m.id, a.column2, m.price, ROUND(m.price * a.column2, 2) '
+            f'FROM (VALUES {values}) a INNER JOIN {menu} m ON m.id = a.column1 '
+            f'WHERE true '
+            f'ON CONFLICT (menuitem_id, user_id) DO UPDATE SET '
+            f'quantity = {cart}.quantity + excluded.quantity, '
+            f'price = ROUND({cart}.unit_price * ({cart}.quantity + excluded.quantity), 2)'
+        )
+        params = [user.pk]
+        params.extend(value for item in quantities.items() for value in item)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -35,6 +73,8 @@ class Cart(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
+    objects = CartManager()
+
     class Meta:
         unique_together = ('menuitem', 'user')
 
@@ -46,6 +86,19 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    class Meta:
+        indexes = [
+            # The keyset ordering of GET /api/orders/ per role
+            models.Index(fields=['user', 'date', 'id']),
+            models.Index(fields=['delivery_crew', 'date', 'id']),
+            # Open orders only. SQLite filters booleans as "status" / NOT "status",
+            # which a partial index matches and an index on status doesn't:
+            # the manager's ?status=0, and the crew loads and pending orders of
+            # the automatic assignment
+            models.Index(fields=['date', 'id'], condition=models.Q(status=False), name='order_open_date_idx'),
+            models.Index(fields=['delivery_crew'], condition=models.Q(status=False), name='order_open_crew_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -55,4 +108,92 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        unique_together = ('order', 'menuitem')
\ No newline at end of file
+        unique_together = ('order', 'menuitem')
+
+class OrderEvent(models.Model):
+    """
+    Append-only log of the order changes, read by the order feed (see order_feed.py).
+    The ids are the feed cursor.
+    """
+    CREATED = 'created'
+    ASSIGNED = 'assigned'
+    STATUS = 'status'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    KINDS = [(kind, kind) for kind in (CREATED, ASSIGNED, STATUS, UPDATED, DELETED)]
+
+    # Plain ids rather than foreign keys: the events outlive deleted orders
+    order_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KINDS)
+    # The order's customer and crew when it changed, for the visibility rules
+    user_id = models.IntegerField(db_index=True)
+    delivery_crew_id = models.IntegerField(null=True, db_index=True)
+    previous_delivery_crew_id = models.IntegerField(null=True, db_index=True)
+    status = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+# Sales rollups, kept up to date by the order views (see rollups.py)
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    items = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily sales'
+
+
+class MenuItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Menu item sales'
+        # One row per day: the top sellers of GET /api/analytics/sales add up the requested range
+        unique_together = ('date', 'menuitem')
+
+
+class CategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Category sales'
+        unique_together = ('date', 'category')
+
+
+# Delivered orders moved out of Order and OrderItem by manage.py archive_orders (see archive.py)
+class ArchivedOrder(models.Model):
+    # The id of the Order it comes from (an auto field so that SQLite makes it the rowid)
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True)
+    status = models.BooleanField(default=True)
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The keyset orderings of GET /api/orders/history, per role
+        indexes = [
+            models.Index(fields=['date', 'id']),
+            models.Index(fields=['user', 'date', 'id']),
+            models.Index(fields=['delivery_crew', 'date', 'id']),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
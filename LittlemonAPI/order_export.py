@@ -0,0 +1,110 @@
+"""
+Streaming export of the orders with their items (CSV or NDJSON), for
+accounting: GET /api/orders/export and manage.py export_orders.
+
+Orders are read by keyset over (date, id) a chunk at a time, and each
+chunk loads its items with one more query, so memory and the time to the
+first byte don't grow with the number of orders exported. The live and the
+archived orders (see archive.py) are merged into a single stream in (date,
+id) order. NDJSON lines are the orders as GET /api/orders/ renders them;
+CSV has one row per order item.
+
+The two tables are read by separate cursors, one chunk at a time, so an
+export running while archive_orders() moves orders can skip or repeat
+the orders moved between its reads: don't schedule them together.
+"""
+import csv
+import heapq
+import io
+import json
+
+from asgiref.sync import sync_to_async
+
+from .db import read_only_queries
+from .fast_serializers import order_reader, archived_order_reader
+from .models import Order, ArchivedOrder
+from .pagination import KeysetPagination
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+ORDER_COLUMNS = ['id', 'date', 'user', 'delivery_crew_id', 'status', 'total']
+ITEM_COLUMNS = ['menuitem_name', 'quantity', 'unit_price', 'price']
+ORDERING = ['date', 'id']
+
+
+def _read_orders(model, reader, filters, chunk_size):
+    """
+    Yields the rendered orders of one table in (date, id) order
+    """
+    queryset = model.objects.filter(**filters).order_by(*ORDERING)
+    position = None
+    while True:
+        chunk = queryset if position is None else queryset.filter(KeysetPagination.after(ORDERING, position))
+        # Each chunk on its own: the stream outlives the view's read routing
+        with read_only_queries():
+            rows = list(reader.values(chunk[:chunk_size]))
+            orders = reader.render(rows)
+        yield from orders
+        if len(rows) < chunk_size:
+            return
+        position = [rows[-1]['date'], rows[-1]['id']]
+
+
+def read_orders(date_from=None, date_to=None, delivered=None, chunk_size=500):
+    """
+    Yields the live and archived orders in the date range (both ends
+    included, None for open), delivered or not when `delivered` is set
+    """
+    filters = {}
+    if date_from is not None:
+        filters['date__gte'] = date_from
+    if date_to is not None:
+        filters['date__lte'] = date_to
+    if delivered is not None:
+        filters['status'] = delivered
+    return heapq.merge(
+        _read_orders(Order, order_reader, filters, chunk_size),
+        _read_orders(ArchivedOrder, archived_order_reader, filters, chunk_size),
+        key=lambda order: (order['date'], order['id']),
+    )
+
+
+def export_orders(fmt='csv', chunk_size=500, **filters):
+    """
+    Yields the orders selected by `filters` (see read_orders()) as CSV or
+    NDJSON text
+    """
+    orders = read_orders(chunk_size=chunk_size, **filters)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['order_id'] + ORDER_COLUMNS[1:] + ITEM_COLUMNS)
+        for order in orders:
+            head = [order[column] for column in ORDER_COLUMNS]
+            for item in order['items'] or [dict.fromkeys(ITEM_COLUMNS)]:
+                writer.writerow(head + [item[column] for column in ITEM_COLUMNS])
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for order in orders:
+            yield json.dumps(order, default=str) + '\n'
+
+
+async def aexport_orders(fmt='csv', chunk_size=500, **filters):
+    """
+    export_orders() as an async iterator, for StreamingHttpResponse under
+    ASGI (which would read a sync iterator whole before sending anything)
+    """
+    chunks = export_orders(fmt, chunk_size, **filters)
+    # StopIteration can't cross sync_to_async
+    done = object()
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(chunks, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
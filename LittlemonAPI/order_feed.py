@@ -0,0 +1,151 @@
+"""
+Order change feed, GET /api/orders/events.
+
+The order views append an OrderEvent for every change and bump a marker
+file once the transaction commits. Waiting clients only read the marker
+(see FileVersionMarker) and query the log when it moves, so an idle crew
+app costs no query instead of a full GET /api/orders/ every few seconds.
+The event ids are the cursor (`since`, or Last-Event-ID for Server-Sent
+Events); SQLite has one writer at a time, so ids are committed in order.
+"""
+import asyncio
+import math
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from rest_framework.exceptions import ValidationError
+
+from .db import read_only_queries
+from .models import OrderEvent
+from .utils import FileVersionMarker, get_user_roles
+
+EVENT_FIELDS = ('id', 'order_id', 'kind', 'user_id', 'delivery_crew_id', 'previous_delivery_crew_id',
+                'status', 'created')
+
+order_feed = FileVersionMarker('ORDER_FEED_VERSION_FILE', 'littlemon-orders.version')
+
+
+def record_order_event(kind, order, previous_delivery_crew_id=None):
+    """
+    Appends an event for `order`; call it inside the transaction that changes the order
+    """
+    OrderEvent.objects.create(
+        order_id=order.pk, kind=kind, user_id=order.user_id, delivery_crew_id=order.delivery_crew_id,
+        previous_delivery_crew_id=previous_delivery_crew_id, status=order.status,
+    )
+    transaction.on_commit(order_feed.bump)
+
+
+def record_order_events(events):
+    """
+    record_order_event() for a batch of unsaved OrderEvent instances
+    """
+    OrderEvent.objects.bulk_create(events)
+    transaction.on_commit(order_feed.bump)
+
+
+def parse_since(request):
+    """
+    The `since` cursor, or Last-Event-ID when an EventSource reconnects
+    """
+    value = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    if not value:
+        return None
+    try:
+        since = int(value)
+    except ValueError:
+        since = -1
+    if since < 0:
+        raise ValidationError({'since': "Expected a cursor returned by the feed"})
+    return since
+
+
+def parse_wait(request):
+    """
+    Seconds a long-poll may wait for an event (`wait`, capped at ORDER_FEED_WAIT)
+    """
+    default = getattr(settings, 'ORDER_FEED_WAIT', 25)
+    try:
+        wait = float(request.GET.get('wait', default))
+    except ValueError:
+        wait = math.nan
+    # float() takes "nan" and "inf": a NaN deadline would never pass
+    if not math.isfinite(wait):
+        raise ValidationError({'wait': "Expected a number of seconds"})
+    return min(max(wait, 0), default)
+
+
+def visible_events(user):
+    """
+    The events of the orders the user can see with GET /api/orders/
+    """
+    roles = get_user_roles(user)
+    if "Customer" in roles:
+        return OrderEvent.objects.filter(user_id=user.pk)
+    if "Manager" in roles:
+        return OrderEvent.objects.all()
+    # A crew member also hears about the orders taken away from them
+    return OrderEvent.objects.filter(Q(delivery_crew_id=user.pk) | Q(previous_delivery_crew_id=user.pk))
+
+
+def render_event(row):
+    return {
+        'id': row['id'],
+        'order': row['order_id'],
+        'kind': row['kind'],
+        'user': row['user_id'],
+        'delivery_crew_id': row['delivery_crew_id'],
+        'previous_delivery_crew_id': row['previous_delivery_crew_id'],
+        'status': row['status'],
+        'created': row['created'],
+    }
+
+
+def next_cursor(rows, latest, batch_size):
+    # A full batch may have more behind it, otherwise everything up to
+    # `latest` has been seen, including the events the user can't see
+    return rows[-1]['id'] if len(rows) == batch_size else latest
+
+
+def fetch_events(user, since):
+    """
+    Returns (events after `since` visible to the user, next cursor).
+    Without `since` the feed starts at the latest event.
+    """
+    batch_size = getattr(settings, 'ORDER_FEED_BATCH', 100)
+    with read_only_queries():
+        latest = OrderEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+        if since is None or since >= latest:
+            return [], max(latest, since or 0)
+        rows = list(visible_events(user).filter(id__gt=since, id__lte=latest)
+                    .order_by('id').values(*EVENT_FIELDS)[:batch_size])
+    return [render_event(row) for row in rows], next_cursor(rows, latest, batch_size)
+
+
+async def afetch_events(user, since):
+    batch_size = getattr(settings, 'ORDER_FEED_BATCH', 100)
+    with read_only_queries():
+        latest = (await OrderEvent.objects.aaggregate(latest=Max('id')))['latest'] or 0
+        if since is None or since >= latest:
+            return [], max(latest, since or 0)
+        rows = [row async for row in visible_events(user).filter(id__gt=since, id__lte=latest)
+                .order_by('id').values(*EVENT_FIELDS)[:batch_size]]
+    return [render_event(row) for row in rows], next_cursor(rows, latest, batch_size)
+
+
+async def wait_for_events(user, since, timeout):
+    """
+    afetch_events(), waiting up to `timeout` seconds for at least one event
+    """
+    interval = getattr(settings, 'ORDER_FEED_POLL_INTERVAL', 0.25)
+    deadline = time.monotonic() + timeout
+    while True:
+        # Read before the query, so that a commit in between isn't missed
+        version = order_feed.version()
+        events, since = await afetch_events(user, since)
+        if events or time.monotonic() >= deadline:
+            return events, since
+        while order_feed.version() == version and time.monotonic() < deadline:
+            await asyncio.sleep(interval)
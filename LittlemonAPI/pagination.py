@@ -0,0 +1,210 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with a WHERE clause on the ordering columns of the last
+row seen instead of OFFSET, and no COUNT(*) is run unless the client asks
+for the (cached, approximate) total. Deep pages therefore cost the same as
+the first one as long as the ordering is backed by an index.
+"""
+import base64
+import binascii
+import functools
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# What a cursor built for another ordering, or tampered with, makes the
+# lookups or the query raise
+INVALID_CURSOR_ERRORS = (TypeError, ValueError, ValidationError)
+
+
+class KeysetPagination(BasePagination):
+    # The last field has to be unique so that every row has its own position
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    total_query_param = 'with_total'
+    total_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.prepare(queryset, request)
+        if request.query_params.get(self.total_query_param):
+            self.total = self.get_total(queryset)
+        try:
+            rows = list(page_queryset)
+        except INVALID_CURSOR_ERRORS:
+            raise NotFound('Invalid cursor')
+        return self.finish(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same as paginate_queryset(), for the async views
+        page_queryset = self.prepare(queryset, request)
+        if request.query_params.get(self.total_query_param):
+            self.total = await self.aget_total(queryset)
+        try:
+            rows = [row async for row in page_queryset]
+        except INVALID_CURSOR_ERRORS:
+            raise NotFound('Invalid cursor')
+        return self.finish(rows)
+
+    def prepare(self, queryset, request):
+        """
+        The (lazy) queryset of the requested page plus one row
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.total = None
+
+        self.position, self.reverse = self.decode_cursor(request)
+        ordering = [self._flip(field) for field in self.ordering] if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, self.position))
+            except INVALID_CURSOR_ERRORS:
+                raise NotFound('Invalid cursor')
+        # One extra row tells whether there is a page after this one
+        return queryset[:self.page_size + 1]
+
+    def finish(self, rows):
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_position = self.previous_position = None
+        if page:
+            has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+            if has_next:
+                self.next_position = self.get_position(page[-1])
+            if has_previous:
+                self.previous_position = self.get_position(page[0])
+        elif position is not None:
+            # Stepped past the end: offer the way back
+            self.previous_position = position if not reverse else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        # Keep an ordering set by the view or OrderingFilter, made unique with the pk
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or list(self.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def get_total(self, queryset):
+        key = self._total_key(queryset)
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.total_cache_timeout)
+        return total
+
+    async def aget_total(self, queryset):
+        key = self._total_key(queryset)
+        total = await cache.aget(key)
+        if total is None:
+            total = await queryset.acount()
+            await cache.aset(key, total, self.total_cache_timeout)
+        return total
+
+    @staticmethod
+    def _total_key(queryset):
+        sql, params = queryset.query.sql_with_params()
+        return 'littlemon:keyset-total:' + hashlib.sha1(f'{sql}|{params}'.encode()).hexdigest()
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _value(row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return functools.reduce(getattr, field.split('__'), row)
+
+    def get_position(self, row):
+        return [self._value(row, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def after(ordering, position):
+        """
+        Rows strictly after position in the given ordering:
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        first = ordering[0].lstrip('-')
+        # Redundant bound on the first column so the index gives a range scan
+        condition = Q(**{f"{first}__{'lte' if ordering[0].startswith('-') else 'gte'}": position[0]})
+        alternatives = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {name.lstrip('-'): value for name, value in zip(ordering[:index], position)}
+            alternatives |= Q(**equal, **{f'{field.lstrip("-")}__{lookup}': position[index]})
+        return condition & alternatives
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': reverse}, default=str, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+
+        url = self.request.build_absolute_uri(self.request.path)
+        query = QueryDict(mutable=True)
+        query.update(self.request.query_params)
+        query[self.cursor_query_param] = cursor
+        return f'{url}?{query.urlencode()}'
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload['p'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return position, reverse
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.get_next_link()), ('previous', self.get_previous_link())]
+        if self.total is not None:
+            fields.insert(0, ('count', self.total))
+        fields.append(('results', data))
+        return Response(OrderedDict(fields))
+
+
+class MenuItemKeysetPagination(KeysetPagination):
+    ordering = ('title', 'price', 'id')
+
+
+class OrderKeysetPagination(KeysetPagination):
+    ordering = ('-date', '-id')
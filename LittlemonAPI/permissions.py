@@ -1,21 +1,23 @@
 from rest_framework.permissions import BasePermission
 
+from .utils import get_user_roles
+
 class IsManager(BasePermission):
     def has_permission(self, request, view):
         return (request.user.is_authenticated and 
-                request.user.groups.filter(name='Manager').exists())
+                'Manager' in get_user_roles(request.user))
 
 
 class IsDeliveryCrew(BasePermission):
     def has_permission(self, request, view):
         return (request.user.is_authenticated and 
-                request.user.groups.filter(name='Delivery Crew').exists())
+                'Delivery Crew' in get_user_roles(request.user))
 
 
 class IsCustomer(BasePermission):
     def has_permission(self, request, view):
         return (request.user.is_authenticated or 
-                request.user.groups.filter(name='Customer').exists())
+                'Customer' in get_user_roles(request.user))
     
 
 class IsCustomerOrManagerOrDeliveryCrew(BasePermission):
@@ -23,25 +25,25 @@ class IsCustomerOrManagerOrDeliveryCrew(BasePermission):
     Autorise l'accès si l'utilisateur est Customer, Manager ou Delivery Crew
     """
     def has_permission(self, request, view):
-        return request.user.groups.filter(
-            name__in=["Customer", "Manager", "Delivery Crew"]
-        ).exists()
+        return not get_user_roles(request.user).isdisjoint(
+            ["Customer", "Manager", "Delivery Crew"]
+        )
     
 
 class IsManagerOrDeliveryCrew(BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(
-            name__in=["Manager", "Delivery Crew"]
-        ).exists()
+        return not get_user_roles(request.user).isdisjoint(
+            ["Manager", "Delivery Crew"]
+        )
 
 class IsManagerOrAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(
-            name__in=["Manager", "Admin"]
-        ).exists()
+        return not get_user_roles(request.user).isdisjoint(
+            ["Manager", "Admin"]
+        )
     
 
 # class IsCustomer(BasePermission):
 #     def has_permission(self, request, view):
 #         return request.user.is_authenticated and (not (IsManager().has_permission(request, view) and \
-#                not (IsDeliveryCrew().has_permission(request, view))))
\ No newline at end of file
+#                not (IsDeliveryCrew().has_permission(request, view))))
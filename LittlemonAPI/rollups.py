@@ -0,0 +1,123 @@
+"""
+Sales rollups (DailySales, MenuItemSales, CategorySales), one row per day
+(and per menu item or category).
+
+The order views keep them up to date in the transaction that changes the
+orders, so the analytics endpoint never aggregates the order history.
+rebuild_rollups() (manage.py rebuild_rollups) recomputes them from the
+orders, e.g. after loading orders in bulk (manage.py seed does it itself).
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import (MenuItem, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySales, MenuItemSales,
+                     CategorySales)
+
+
+def add_order(order_date, total, lines, delivered=False, sign=1):
+    """
+    Adds an order to the rollups, or takes it out again with sign=-1.
+    `lines` are (menuitem_id, quantity, price) tuples.
+    """
+    qn = connection.ops.quote_name
+    daily = qn(DailySales._meta.db_table)
+    items = qn(MenuItemSales._meta.db_table)
+    categories = qn(CategorySales._meta.db_table)
+    menu = qn(MenuItem._meta.db_table)
+    values = ', '.join(['(%s, %s, %s)'] * len(lines))
+    line_params = [value for menuitem_id, quantity, price in lines for value in (menuitem_id, sign * quantity, sign * price)]
+    item_values = ', '.join(['(%s, %s, %s, %s)'] * len(lines))
+    item_params = [value for menuitem_id, quantity, price in lines
+                   for value in (order_date, menuitem_id, sign * quantity, sign * price)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {daily} (date, orders, delivered, items, revenue) VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (date) DO UPDATE SET '
+            f'orders = {daily}.orders + excluded.orders, '
+            f'delivered = {daily}.delivered + excluded.delivered, '
+            f'items = {daily}.items + excluded.items, '
+            f'revenue = ROUND({daily}.revenue + excluded.revenue, 2)',
+            [order_date, sign, sign * int(delivered), sign * sum(quantity for _, quantity, _ in lines), sign * total],
+        )
+        if not lines:
+            return
+        cursor.execute(
+            f'INSERT INTO {items} (date, menuitem_id, quantity, revenue) '
+            f'VALUES {item_values} '
+            f'ON CONFLICT (date, menuitem_id) DO UPDATE SET '
+            f'quantity = {items}.quantity + excluded.quantity, '
+            f'revenue = ROUND({items}.revenue + excluded.revenue, 2)',
+            item_params,
+        )
+        # "WHERE true" keeps SQLite from reading ON CONFLICT as part of the join
+        cursor.execute(
+            f'INSERT INTO {categories} (date, category_id, quantity, revenue) '
+            f'SELECT %s, m.category_id, SUM(a.column2), ROUND(SUM(a.column3), 2) '
+            f'FROM (VALUES {values}) a INNER JOIN {menu} m ON m.id = a.column1 '
+            f'WHERE true GROUP BY m.category_id '
+            f'ON CONFLICT (date, category_id) DO UPDATE SET '
+            f'quantity = {categories}.quantity + excluded.quantity, '
+            f'revenue = ROUND({categories}.revenue + excluded.revenue, 2)',
+            [order_date, *line_params],
+        )
+
+
+def remove_order(order_date, total, lines, delivered):
+    add_order(order_date, total, lines, delivered, sign=-1)
+
+
+def update_delivered(order_date, was_delivered, delivered):
+    if was_delivered != delivered:
+        DailySales.objects.filter(date=order_date).update(delivered=F('delivered') + (1 if delivered else -1))
+
+
+def add_delivered(deltas):
+    """
+    update_delivered() for a batch: {order date: change in delivered orders}
+    """
+    for order_date, delta in deltas.items():
+        if delta:
+            DailySales.objects.filter(date=order_date).update(delivered=F('delivered') + delta)
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """
+    Recomputes every rollup from the live and the archived orders.
+    Returns {model: rows written}.
+    """
+    for model in (DailySales, MenuItemSales, CategorySales):
+        model.objects.all().delete()
+
+    daily = defaultdict(lambda: {'orders': 0, 'delivered': 0, 'items': 0, 'revenue': 0})
+    menu_items = defaultdict(lambda: {'quantity': 0, 'revenue': 0})
+    categories = defaultdict(lambda: {'quantity': 0, 'revenue': 0})
+    for orders, items in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        for row in orders.objects.values('date').annotate(
+                orders=Count('id'), delivered=Count('id', filter=Q(status=True)), revenue=Sum('total')).order_by():
+            _add(daily[row.pop('date')], row)
+        for row in items.objects.values('order__date').annotate(items=Sum('quantity')).order_by():
+            _add(daily[row.pop('order__date')], row)
+        for row in items.objects.values('order__date', 'menuitem_id').annotate(
+                quantity=Sum('quantity'), revenue=Sum('price')).order_by():
+            _add(menu_items[row.pop('order__date'), row.pop('menuitem_id')], row)
+        for row in items.objects.values('order__date', 'menuitem__category_id').annotate(
+                quantity=Sum('quantity'), revenue=Sum('price')).order_by():
+            _add(categories[row.pop('order__date'), row.pop('menuitem__category_id')], row)
+
+    DailySales.objects.bulk_create(
+        (DailySales(date=day, **totals) for day, totals in daily.items()), batch_size=5000)
+    MenuItemSales.objects.bulk_create(
+        (MenuItemSales(date=day, menuitem_id=pk, **totals) for (day, pk), totals in menu_items.items()), batch_size=5000)
+    CategorySales.objects.bulk_create(
+        (CategorySales(date=day, category_id=pk, **totals) for (day, pk), totals in categories.items()),
+        batch_size=5000)
+    return {DailySales: len(daily), MenuItemSales: len(menu_items), CategorySales: len(categories)}
+
+
+def _add(totals, row):
+    for key, value in row.items():
+        totals[key] += value or 0
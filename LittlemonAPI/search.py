@@ -0,0 +1,61 @@
+"""
+Full-text search over menu items with SQLite FTS5.
+
+LittlemonAPI_menuitem_fts indexes each menu item's title and its category
+(title and slug) under the menu item's id. SQL triggers keep it in sync
+with every write, bulk ones included. Migration 0003 creates them. The
+triggers live on the menu item and category tables, so a migration that
+rebuilds one of those tables (SQLite's way of altering a column) has to
+create them again with a copy of those statements.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter, OrderingFilter
+
+FTS_TABLE = 'LittlemonAPI_menuitem_fts'
+MENUITEM_TABLE = 'LittlemonAPI_menuitem'
+
+
+def build_match_query(terms):
+    """
+    Turns search terms into an FTS5 query where every word has to match
+    as a prefix, e.g. ['chick', 'sal'] -> '"chick"* "sal"*'
+    """
+    words = [word for term in terms for word in re.findall(r'\w+', term)]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class MenuItemSearchFilter(SearchFilter):
+    """
+    SearchFilter that answers from the FTS index and annotates each menu
+    item with its bm25 `search_rank` (lower is better, title weighs more).
+    Falls back to the LIKE based search on other databases.
+    """
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or connection.vendor != 'sqlite':
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(terms)
+        if not match:
+            return queryset.none()
+
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        ).annotate(search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {MENUITEM_TABLE}.id',
+            (match,),
+        ))
+
+
+class RankedOrderingFilter(OrderingFilter):
+    """
+    Orders search results by relevance unless the client asked for an ordering
+    """
+    def filter_queryset(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return queryset.order_by('search_rank', *(self.get_default_ordering(view) or ()))
+        return super().filter_queryset(request, queryset, view)
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.models import User
 
-from .models import MenuItem, Category, Cart, Order, OrderItem
+from .models import MenuItem, Category, Cart, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -68,9 +68,22 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, source='orderitem_set')
+    items = OrderItemSerializer(many=True, source='orderitem_set', read_only=True)
     
     class Meta:
         model = Order
         fields = ['id', 'user', 'delivery_crew_id', 'status', 'total', 'date', 'items']
-        read_only_fields = ['user', 'total', 'date', 'items']
\ No newline at end of file
+        read_only_fields = ['user', 'total', 'date', 'items']
+
+
+# Archived orders render exactly like the live ones
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    items = ArchivedOrderItemSerializer(many=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User, Group
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .menu_cache import bump_menu_version
+from .models import MenuItem, Category
+from .utils import invalidate_user_roles
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_menu_catalog(sender, **kwargs):
+    # Wait for the commit so no reader can cache the old rows under the new version
+    transaction.on_commit(bump_menu_version)
+
+
+def invalidate_roles_on_commit(user_ids):
+    # Until the commit, other connections still read the old memberships
+    # and would cache them again
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: invalidate_user_roles(user_ids))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # instance is the User whose groups changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.__dict__.pop('_roles', None)
+            invalidate_roles_on_commit([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # instance is the Group, pk_set holds the users
+        invalidate_roles_on_commit(pk_set)
+    elif action == 'pre_clear':
+        # The members have to be read before the clear
+        invalidate_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_roles_on_group_rename(sender, instance, created, **kwargs):
+    # The cached roles are group names
+    if not created:
+        invalidate_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_delete(sender, instance, **kwargs):
+    invalidate_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+# The cached users only have to go when they could no longer authenticate:
+# not on every save (last_login is saved at each login)
+CREDENTIAL_FIELDS = ('password', 'is_active')
+
+
+@receiver(pre_save, sender=User)
+def detect_credential_change(sender, instance, update_fields=None, **kwargs):
+    instance._credentials_changed = False
+    if instance.pk is None or (update_fields is not None and not set(CREDENTIAL_FIELDS) & set(update_fields)):
+        return
+    saved = User.objects.filter(pk=instance.pk).values_list(*CREDENTIAL_FIELDS).first()
+    instance._credentials_changed = saved is not None and saved != tuple(getattr(instance, name) for name in CREDENTIAL_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_credential_change(sender, instance, **kwargs):
+    if instance.__dict__.pop('_credentials_changed', False):
+        transaction.on_commit(token_cache.revoke)
+
+
+@receiver(post_delete, sender=Token)
+def revoke_cached_tokens(sender, **kwargs):
+    # Until the commit, other connections still read the deleted token and
+    # would cache it again under the new version
+    transaction.on_commit(token_cache.revoke)
@@ -1,3 +1,1199 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User, Group, update_last_login
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
+
+from .authentication import token_cache
+from .db import REPLICA
+from .idempotency import IdempotencyStore, idempotency_store, idempotent
+from .menu_cache import menu_catalog
+from .menu_io import clean_row, import_menu
+from .metrics import MetricsRegistry, metrics_dir, registry
+from .middleware import ProfilerMiddleware
+from .order_feed import order_feed, record_order_event
+from .archive import archive_orders
+from . import assignment
+from .assignment import AssignmentWorker, assign_pending_orders
+from .management.commands._bench import create_user
+from .models import Category, MenuItem, Cart, Order, OrderItem, OrderEvent, ArchivedOrder, DailySales, MenuItemSales, CategorySales
+from .pagination import MenuItemKeysetPagination
+from . import rollups
+from .rollups import rebuild_rollups
+from .search import FTS_TABLE
+from .urls import get_urlpatterns
+from .utils import FileVersionMarker, get_user_roles
+from .views import OrderCustomerView
+
+# The URLconf of the ASGI deployment, with the async read views (see urls.py):
+# @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+urlpatterns = [path('api/', include(get_urlpatterns(async_reads=True)))]
+ASYNC_URLCONF = __name__
+
+
+class LittlemonTestMixin:
+    """
+    Runs without throttling, with the host-wide caches and marker files
+    in a temporary directory so the tests never see a running server's
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp(prefix='littlemon-tests-')
+        cls.settings_override = override_settings(
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+            CACHES={**settings.CACHES, 'shared': {**settings.CACHES['shared'], 'LOCATION': f'{cls.tmp_dir}/cache'}},
+            MENU_CACHE_VERSION_FILE=f'{cls.tmp_dir}/menu.version',
+            TOKEN_CACHE_REVOCATION_FILE=f'{cls.tmp_dir}/tokens.version',
+            ORDER_FEED_VERSION_FILE=f'{cls.tmp_dir}/orders.version',
+            METRICS_DIR=f'{cls.tmp_dir}/metrics',
+            TRAFFIC_RECORD_PATH=None,
+            # 'replica' is another connection: it wouldn't see the rows of
+            # the transaction each test runs in
+            DATABASE_ROUTERS=[],
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def setUp(self):
+        # Rolled back rows give their ids to the next test: forget what
+        # the in-process and shared caches know about them
+        caches['shared'].clear()
+        menu_catalog.bump()
+        token_cache.revoke()
+        with idempotency_store._lock:
+            idempotency_store._entries.clear()
+
+    def login(self, username, *groups):
+        """
+        Creates a user in the given groups and authenticates the client as them
+        """
+        user, self.token = create_user(username, *groups)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        return user
+
+
+class LittlemonTestCase(LittlemonTestMixin, APITestCase):
+    pass
+
+
+def create_menu():
+    """
+    Two categories, three menu items: returns the items by title
+    """
+    starters = Category.objects.create(slug='starters', title='Starters')
+    desserts = Category.objects.create(slug='desserts', title='Desserts')
+    return {item.title: item for item in MenuItem.objects.bulk_create([
+        MenuItem(title='Bruschetta', price=Decimal('5.00'), category=starters),
+        MenuItem(title='Greek Salad', price=Decimal('12.50'), category=starters),
+        MenuItem(title='Lemon Dessert', price=Decimal('6.25'), category=desserts),
+    ])}
+
+
+class MenuImportTests(LittlemonTestCase):
+    def row(self, **values):
+        return {'title': 'Greek Salad', 'price': '12.5', 'category_title': 'Starters', **values}
+
+    def test_clean_row(self):
+        row = clean_row(self.row(featured='yes'))
+        self.assertEqual(row['price'], Decimal('12.50'))
+        self.assertTrue(row['featured'])
+        self.assertEqual(row['category_slug'], 'starters')
+
+    def test_invalid_prices(self):
+        for price in ('NaN', 'nan', 'sNaN', 'Infinity', '-Infinity', '', None, 'abc', '0', '10000'):
+            with self.subTest(price=price), self.assertRaises(ValueError):
+                clean_row(self.row(price=price))
+
+    def test_import_reports_invalid_rows(self):
+        stream = io.StringIO(
+            'title,price,category_title\n'
+            'Greek Salad,12.50,Starters\n'
+            'Bruschetta,NaN,Starters\n'
+            'Lemon Dessert,Infinity,Desserts\n'
+            'Pasta,,Mains\n'
+        )
+        summary = import_menu(stream, 'csv')
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual([error['line'] for error in summary['errors']], [3, 4, 5])
+        self.assertEqual(list(MenuItem.objects.values_list('title', flat=True)), ['Greek Salad'])
+
+    def test_failed_import_invalidates_the_written_chunks(self):
+        def lines():
+            yield 'title,price,category_title\n'
+            yield 'Greek Salad,12.50,Starters\n'
+            yield 'Bruschetta,5.00,Starters\n'
+            raise OSError('Connection reset')
+
+        version = menu_catalog.version()
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(OSError):
+            import_menu(lines(), 'csv', chunk_size=1)
+        self.assertEqual(MenuItem.objects.count(), 2)
+        self.assertNotEqual(menu_catalog.version(), version)
+
+    def test_import_endpoint(self):
+        self.login('manager', 'Manager')
+        upload = io.BytesIO(b'{"title": "Bruschetta", "price": "NaN", "category_title": "Starters"}\n'
+                            b'{"title": "Greek Salad", "price": 12.5, "category_title": "Starters"}\n')
+        upload.name = 'menu.ndjson'
+        response = self.client.post('/api/menu-items/import', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 1)
+        self.assertTrue(Category.objects.filter(slug='starters').exists())
+
+
+class MenuCatalogCacheTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        create_menu()
+
+    def test_marker_versions(self):
+        with override_settings(TEST_VERSION_FILE=os.path.join(self.tmp_dir, 'test.version')):
+            marker = FileVersionMarker('TEST_VERSION_FILE', 'unused.version')
+            versions = {marker.version()}
+            self.assertEqual(marker.version(), next(iter(versions)))
+            for _ in range(50):
+                marker.bump()
+                versions.add(marker.version())
+            os.remove(marker.path)
+            versions.add(marker.version())
+            self.assertEqual(len(versions), 52)
+
+    def test_etag(self):
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        for if_none_match in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+        # Another page has its own ETag
+        self.assertNotEqual(self.client.get('/api/menu-items/', {'page_size': 1})['ETag'], etag)
+
+    def test_invalidation(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(title='Bruschetta').get().delete()
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotIn('Bruschetta', [item['title'] for item in response.data['results']])
+
+        # Bumped by another process
+        etag = response['ETag']
+        FileVersionMarker('MENU_CACHE_VERSION_FILE', 'littlemon-menu.version').bump()
+        self.assertEqual(self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SearchTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = create_menu()
+        specials = Category.objects.create(slug='greek-specials', title='Greek Specials')
+        desserts = Category.objects.get(slug='desserts')
+        for title, category in (('Greek Yogurt', desserts), ('Feta Plate', specials), ('Crème Brûlée', desserts)):
+            self.menu[title] = MenuItem.objects.create(title=title, price=Decimal('7.00'), category=category)
+
+    def search(self, terms, **params):
+        response = self.client.get('/api/menu-items/', {'search': terms, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, terms, **params):
+        return [item['title'] for item in self.search(terms, page_size=10, **params).data['results']]
+
+    def indexed(self, match):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid', [match])
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_search(self):
+        # Title matches first (bm25, the title weighs more), then the category ones
+        self.assertEqual(self.titles('greek'), ['Greek Salad', 'Greek Yogurt', 'Feta Plate'])
+        self.assertEqual(self.titles('gre sal'), ['Greek Salad'])
+        self.assertEqual(self.titles('creme brulee'), ['Crème Brûlée'])
+        self.assertEqual(self.titles('starters'), ['Bruschetta', 'Greek Salad'])
+        self.assertEqual(self.titles('"*'), [])
+        self.assertEqual(self.titles('pizza'), [])
+
+    def test_ranked_pages(self):
+        titles, response = [], self.search('greek', page_size=1)
+        while True:
+            titles += [item['title'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titles, ['Greek Salad', 'Greek Yogurt', 'Feta Plate'])
+        # An explicit ordering wins over the rank
+        self.assertEqual(self.titles('greek', ordering='-title'), ['Greek Yogurt', 'Greek Salad', 'Feta Plate'])
+
+    def test_triggers(self):
+        tart = MenuItem.objects.create(title='Lemon Tart', price=Decimal('4.00'), category=self.menu['Feta Plate'].category)
+        self.assertEqual(self.indexed('tart'), [tart.pk])
+        self.assertIn(tart.pk, self.indexed('specials'))
+
+        # Queryset and bulk writes too: they don't send signals
+        MenuItem.objects.filter(pk=tart.pk).update(title='Lemon Pie')
+        self.assertEqual((self.indexed('tart'), self.indexed('pie')), ([], [tart.pk]))
+        MenuItem.objects.filter(pk=tart.pk).update(category=self.menu['Bruschetta'].category)
+        self.assertNotIn(tart.pk, self.indexed('specials'))
+        self.assertIn(tart.pk, self.indexed('starters'))
+
+        Category.objects.filter(slug='starters').update(title='Antipasti')
+        self.assertEqual(self.indexed('antipasti'), sorted([self.menu['Bruschetta'].pk, self.menu['Greek Salad'].pk, tart.pk]))
+        self.assertIn(tart.pk, self.indexed('starters'))  # still in the slug
+
+        MenuItem.objects.filter(pk=tart.pk).delete()
+        self.assertEqual(self.indexed('pie'), [])
+        self.assertNotIn(tart.pk, self.indexed('antipasti'))
+
+
+def cursor(position, reverse=False):
+    payload = json.dumps({'p': position, 'r': reverse})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+class KeysetPaginationTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(slug='starters', title='Starters')
+        for title in ('Bruschetta', 'Greek Salad', 'Lemon Dessert'):
+            MenuItem.objects.create(title=title, price=Decimal('5.00'), category=category)
+
+    def test_pages(self):
+        response = self.client.get('/api/menu-items/', {'page_size': 2})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Bruschetta', 'Greek Salad'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['title'] for item in response.data['results']], ['Lemon Dessert'])
+        self.assertIsNone(response.data['next'])
+
+    def test_tampered_cursors(self):
+        for position in (['Bruschetta', '5.00', {'id': 1}], ['Bruschetta', [1, 2], 1],
+                         ['Bruschetta', 'abc', 1], ['Bruschetta', '5.00']):
+            with self.subTest(position=position):
+                response = self.client.get('/api/menu-items/', {'cursor': cursor(position)})
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/menu-items/', {'cursor': 'not base64'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_order_cursor(self):
+        self.login('customer', 'Customer')
+        response = self.client.get('/api/orders/', {'cursor': cursor(['not a date', 1])})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_tampered_cursor_async(self):
+        request = Request(APIRequestFactory().get('/api/menu-items/', {'cursor': cursor(['Bruschetta', '5.00', {'id': 1}])}))
+        with self.assertRaises(NotFound):
+            await MenuItemKeysetPagination().apaginate_queryset(MenuItem.objects.order_by('title', 'price'), request)
+
+
+class SalesAnalyticsTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login('manager', 'Manager')
+
+    def test_top(self):
+        self.assertEqual(self.client.get('/api/analytics/sales', {'top': 5}).status_code, 200)
+        for top in ('-5', '0', 'abc'):
+            with self.subTest(top=top):
+                self.assertEqual(self.client.get('/api/analytics/sales', {'top': top}).status_code, 400)
+
+    def test_range(self):
+        response = self.client.get('/api/analytics/sales', {'from': '2025-02-01', 'to': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/analytics/sales', {'from': '2025-01-01', 'to': '2025-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {'orders': 0, 'delivered': 0, 'items': 0, 'revenue': 0})
+
+    def test_top_in_range(self):
+        menu = create_menu()
+        salad, dessert = menu['Greek Salad'], menu['Lemon Dessert']
+        for day, item, quantity in ((date(2025, 1, 1), dessert, 5), (date(2025, 1, 2), salad, 2),
+                                    (date(2025, 1, 3), salad, 2)):
+            order = Order.objects.create(user=User.objects.get(username='manager'), total=item.price * quantity, date=day)
+            OrderItem.objects.create(order=order, menuitem=item, quantity=quantity, unit_price=item.price,
+                                     price=item.price * quantity)
+            rollups.add_order(day, order.total, [(item.pk, quantity, order.total)])
+
+        def top(start, end):
+            data = self.client.get('/api/analytics/sales', {'from': start, 'to': end}).data
+            return ([(row['title'], row['quantity']) for row in data['top_menu_items']],
+                    [(row['title'], row['revenue']) for row in data['top_categories']])
+
+        expected = {
+            ('2025-01-01', '2025-01-03'): ([('Lemon Dessert', 5), ('Greek Salad', 4)],
+                                           [('Desserts', Decimal('31.25')), ('Starters', Decimal('50.00'))]),
+            ('2025-01-02', '2025-01-03'): ([('Greek Salad', 4)], [('Starters', Decimal('50.00'))]),
+            ('2025-01-01', '2025-01-01'): ([('Lemon Dessert', 5)], [('Desserts', Decimal('31.25'))]),
+            ('2025-01-04', '2025-01-31'): ([], []),
+        }
+        for (start, end), lists in expected.items():
+            with self.subTest(start=start, end=end):
+                self.assertEqual(top(start, end), lists)
+
+        # Rebuilt from the orders, the rollups hold the same rows
+        rows = sorted(MenuItemSales.objects.values_list('date', 'menuitem_id', 'quantity', 'revenue'))
+        rebuild_rollups()
+        self.assertEqual(sorted(MenuItemSales.objects.values_list('date', 'menuitem_id', 'quantity', 'revenue')), rows)
+        self.assertEqual(top('2025-01-02', '2025-01-03'), expected['2025-01-02', '2025-01-03'])
+
+
+class CartTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = create_menu()
+        self.user = self.login('customer', 'Customer')
+
+    def cart(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('menuitem__title', 'quantity'))
+
+    def test_add_twice(self):
+        salad = self.menu['Greek Salad']
+        response = self.client.post('/api/cart/menu-items/', {'menuitem_id': salad.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/cart/menu-items/', {'menuitem_id': salad.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cart(), {'Greek Salad': 5})
+        line = Cart.objects.get(user=self.user)
+        self.assertEqual((line.unit_price, line.price), (Decimal('12.50'), Decimal('62.50')))
+
+    def test_add_invalid(self):
+        for data, code in (({}, 400), ({'menuitem_id': 'abc'}, 400),
+                           ({'menuitem_id': self.menu['Bruschetta'].pk, 'quantity': 0}, 400),
+                           ({'menuitem_id': 999_999}, 404)):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post('/api/cart/menu-items/', data).status_code, code)
+        self.assertEqual(self.cart(), {})
+
+    def test_batch(self):
+        bruschetta, salad = self.menu['Bruschetta'], self.menu['Greek Salad']
+        self.client.post('/api/cart/menu-items/', {'menuitem_id': salad.pk})
+        response = self.client.post('/api/cart/menu-items/', [
+            {'menuitem_id': bruschetta.pk, 'quantity': 1},
+            {'menuitem_id': salad.pk, 'quantity': 2},
+            {'menuitem_id': bruschetta.pk, 'quantity': 3},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cart(), {'Bruschetta': 4, 'Greek Salad': 3})
+        self.assertEqual(response.data['total'], Decimal('57.50'))
+
+    def test_batch_all_or_nothing(self):
+        bruschetta = self.menu['Bruschetta']
+        response = self.client.post('/api/cart/menu-items/', [
+            {'menuitem_id': bruschetta.pk}, {'menuitem_id': 999_999},
+        ], format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['menuitem_ids'], [999_999])
+        response = self.client.post('/api/cart/menu-items/', [
+            {'menuitem_id': bruschetta.pk}, {'quantity': 2}, {'menuitem_id': bruschetta.pk, 'quantity': -1},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['errors']), {1, 2})
+        self.assertEqual(self.cart(), {})
+
+
+class CheckoutTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = create_menu()
+        self.customer = self.login('customer', 'Customer')
+        self.client.post('/api/cart/menu-items/', [
+            {'menuitem_id': self.menu['Greek Salad'].pk, 'quantity': 2},
+            {'menuitem_id': self.menu['Lemon Dessert'].pk, 'quantity': 1},
+        ], format='json')
+
+    def checkout(self):
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['id'])
+
+    def test_checkout(self):
+        order = self.checkout()
+        self.assertEqual(order.total, Decimal('31.25'))
+        self.assertEqual(order.user, self.customer)
+        self.assertEqual(sorted(OrderItem.objects.filter(order=order).values_list('menuitem__title', 'quantity', 'price')),
+                         [('Greek Salad', 2, Decimal('25.00')), ('Lemon Dessert', 1, Decimal('6.25'))])
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        # Nothing left to order
+        self.assertEqual(self.client.post('/api/orders/').status_code, 400)
+
+    def test_rollups(self):
+        order = self.checkout()
+        daily = DailySales.objects.get(date=order.date)
+        self.assertEqual((daily.orders, daily.delivered, daily.items, daily.revenue), (1, 0, 3, Decimal('31.25')))
+        self.assertEqual(dict(MenuItemSales.objects.values_list('menuitem__title', 'quantity')),
+                         {'Greek Salad': 2, 'Lemon Dessert': 1})
+        self.assertEqual(dict(CategorySales.objects.values_list('category__slug', 'revenue')),
+                         {'starters': Decimal('25.00'), 'desserts': Decimal('6.25')})
+
+        self.login('manager', 'Manager')
+        for method, delivered in (('patch', 1), ('patch', 0), ('put', 1), ('put', 1)):
+            with self.subTest(method=method, delivered=delivered):
+                response = getattr(self.client, method)(f'/api/orders/{order.pk}', {'status': delivered})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(DailySales.objects.get(date=order.date).delivered, delivered)
+
+        self.assertEqual(self.client.delete(f'/api/orders/{order.pk}').status_code, 204)
+        daily = DailySales.objects.get(date=order.date)
+        self.assertEqual((daily.orders, daily.delivered, daily.items, daily.revenue), (0, 0, 0, 0))
+        self.assertEqual(set(MenuItemSales.objects.values_list('quantity', flat=True)), {0})
+        self.assertEqual(set(CategorySales.objects.values_list('revenue', flat=True)), {0})
+
+    def test_analytics(self):
+        order = self.checkout()
+        self.login('manager', 'Manager')
+        response = self.client.get('/api/analytics/sales', {'from': order.date, 'to': order.date, 'top': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['orders'], 1)
+        self.assertEqual([item['title'] for item in response.data['top_menu_items']], ['Greek Salad'])
+
+
+class IdempotencyTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = create_menu()
+        self.customer = self.login('customer', 'Customer')
+
+    def add_to_cart(self, key, title='Greek Salad', quantity=1):
+        return self.client.post('/api/cart/menu-items/', {'menuitem_id': self.menu[title].pk, 'quantity': quantity},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.add_to_cart('add-1', quantity=2)
+        retry = self.add_to_cart('add-1', quantity=2)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+
+        first = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_other_request_with_the_same_key(self):
+        self.add_to_cart('add-1', quantity=2)
+        self.assertEqual(self.add_to_cart('add-1', quantity=3).status_code, 422)
+        response = self.add_to_cart('add-1', title='Bruschetta', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('message', response.data)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+
+    def test_keys_are_per_user(self):
+        self.add_to_cart('add-1')
+        other = self.login('other', 'Customer')
+        response = self.add_to_cart('add-1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertTrue(Cart.objects.filter(user=other).exists())
+
+    def test_invalid_key(self):
+        self.assertEqual(self.add_to_cart('').status_code, 400)
+        response = self.add_to_cart('k' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('message', response.data)
+
+    def test_server_error_releases_the_key(self):
+        self.add_to_cart('add-1')
+        failure = RuntimeError('database is locked')
+        with mock.patch.object(OrderCustomerView, 'create_order_from_cart', side_effect=failure):
+            self.assertEqual(self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 500)
+        retry = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class IdempotentDecoratorTests(LittlemonTestCase):
+    """
+    Concurrent duplicates, on a view method that doesn't touch the database
+    """
+    def setUp(self):
+        super().setUp()
+        self.started, self.release = threading.Event(), threading.Event()
+        self.calls = 0
+
+        @idempotent
+        def post(view, request):
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            return Response({'calls': self.calls}, status=201)
+        self.post = post
+
+    def request(self, key='key-1'):
+        request = Request(APIRequestFactory().post('/api/orders/', HTTP_IDEMPOTENCY_KEY=key))
+        request.user = User(pk=1)
+        return request
+
+    def in_thread(self, request):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.post(None, request)))
+        thread.start()
+        return thread, results
+
+    def test_duplicate_waits_for_the_first_request(self):
+        first, first_results = self.in_thread(self.request())
+        self.assertTrue(self.started.wait(5))
+        duplicate, duplicate_results = self.in_thread(self.request())
+        duplicate.join(0.2)
+        self.assertTrue(duplicate.is_alive())
+        self.release.set()
+        first.join(5)
+        duplicate.join(5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(duplicate_results[0].data, {'calls': 1})
+        self.assertEqual(duplicate_results[0]['Idempotent-Replayed'], 'true')
+
+    @override_settings(IDEMPOTENCY_WAIT=0.1)
+    def test_duplicate_gives_up_after_the_wait(self):
+        first, _ = self.in_thread(self.request())
+        self.assertTrue(self.started.wait(5))
+        response = self.post(None, self.request())
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('message', response.data)
+        self.release.set()
+        first.join(5)
+        self.assertEqual(self.calls, 1)
+
+    def test_eviction_keeps_requests_in_flight(self):
+        store = IdempotencyStore(max_entries=2)
+        running, _ = store.claim('running', 'a')
+        done, _ = store.claim('done', 'b')
+        store.complete('done', done, (201, {}))
+        store.claim('new', 'c')
+        store.claim('newer', 'd')
+        self.assertIs(store.claim('running', 'a')[0], running)
+        self.assertFalse(store.claim('running', 'a')[1])
+        self.assertTrue(store.claim('done', 'b')[1])
+
+
+class OrderBatchTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        menu = create_menu()
+        customer = User.objects.create_user(username='customer')
+        self.crew = User.objects.create_user(username='crew')
+        self.crew.groups.add(Group.objects.get_or_create(name='Delivery Crew')[0])
+        self.orders = []
+        for day, crew in ((date(2025, 1, 1), self.crew), (date(2025, 1, 1), self.crew), (date(2025, 1, 2), None)):
+            order = Order.objects.create(user=customer, delivery_crew=crew, total=Decimal('5.00'), date=day)
+            OrderItem.objects.create(order=order, menuitem=menu['Bruschetta'], quantity=1,
+                                     unit_price=Decimal('5.00'), price=Decimal('5.00'))
+            self.orders.append(order.pk)
+        rebuild_rollups()
+
+    def patch(self, data):
+        return self.client.patch('/api/orders/batch', data, format='json')
+
+    def delivered(self):
+        return dict(DailySales.objects.values_list('date', 'delivered'))
+
+    def test_status(self):
+        self.login('manager', 'Manager')
+        response = self.patch({'orders': self.orders, 'status': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['unchanged']), (3, 0))
+        self.assertEqual(self.delivered(), {date(2025, 1, 1): 2, date(2025, 1, 2): 1})
+
+        response = self.patch({'orders': [str(self.orders[0]), self.orders[2]], 'status': '0'})
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self.delivered(), {date(2025, 1, 1): 1, date(2025, 1, 2): 0})
+        response = self.patch({'orders': self.orders[:1], 'status': 0})
+        self.assertEqual((response.data['updated'], response.data['unchanged']), (0, 1))
+        self.assertEqual(self.delivered(), {date(2025, 1, 1): 1, date(2025, 1, 2): 0})
+
+    def test_assign(self):
+        self.login('manager', 'Manager')
+        response = self.patch({'orders': self.orders, 'delivery_crew_id': self.crew.pk})
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(set(Order.objects.values_list('delivery_crew_id', flat=True)), {self.crew.pk})
+        customer = User.objects.get(username='customer')
+        self.assertEqual(self.patch({'orders': self.orders, 'delivery_crew_id': customer.pk}).status_code, 404)
+
+    def test_missing_orders(self):
+        self.login('manager', 'Manager')
+        response = self.patch({'orders': self.orders + [999_999], 'status': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['order_ids'], [999_999])
+        self.assertFalse(Order.objects.filter(status=True).exists())
+        self.assertEqual(set(self.delivered().values()), {0})
+
+    def test_crew(self):
+        self.client.force_authenticate(self.crew)
+        response = self.patch({'orders': self.orders, 'status': 1})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['order_ids'], [self.orders[2]])
+        self.assertFalse(Order.objects.filter(status=True).exists())
+        self.assertEqual(set(self.delivered().values()), {0})
+
+        self.assertEqual(self.patch({'orders': self.orders[:2], 'delivery_crew_id': self.crew.pk}).status_code, 403)
+        response = self.patch({'orders': self.orders[:2], 'status': 1})
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self.delivered(), {date(2025, 1, 1): 2, date(2025, 1, 2): 0})
+
+    def test_invalid(self):
+        self.login('manager', 'Manager')
+        for data in ({'orders': [], 'status': 1}, {'orders': self.orders[0], 'status': 1},
+                     {'orders': [1.5], 'status': 1}, {'orders': [True], 'status': 1},
+                     {'orders': [' 1'], 'status': 1}, {'orders': ['1a'], 'status': 1},
+                     {'orders': self.orders, 'status': 2}, {'orders': self.orders},
+                     {'orders': self.orders, 'delivery_crew_id': 1.5}):
+            with self.subTest(data=data):
+                response = self.patch(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.data), ['message'])
+        self.assertFalse(Order.objects.filter(status=True).exists())
+
+
+class MetricsTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        # Requests of earlier tests flushed this process's snapshot
+        shutil.rmtree(metrics_dir(), ignore_errors=True)
+
+    def write_snapshot(self, pid, value):
+        os.makedirs(metrics_dir(), exist_ok=True)
+        with open(os.path.join(metrics_dir(), f'{pid}.json'), 'w') as output:
+            json.dump({'histograms': [], 'counters': [[['requests_total'], value]]}, output)
+
+    def test_collect_drops_exited_workers(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        self.write_snapshot(exited.pid, 1)
+        self.write_snapshot(os.getppid(), 10)
+
+        registry = MetricsRegistry()
+        registry.increment(('requests_total',), 100)
+        self.assertEqual(registry.collect()['counters'], {('requests_total',): 110})
+        self.assertEqual(os.listdir(metrics_dir()), [f'{os.getppid()}.json'])
+
+    def query_count(self):
+        return registry.snapshot()['counters'].get(('db_queries', 'api/menu-items/', 'GET'), 0)
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    async def test_async_views_count_queries(self):
+        await sync_to_async(create_menu)()
+        before = await sync_to_async(self.query_count)()
+        # Cold catalog cache: the page comes from the database
+        response = await self.async_client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(await sync_to_async(self.query_count)(), before)
+
+
+class ProfilerTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = os.path.join(self.tmp_dir, 'profiles')
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        create_menu()
+
+    def profiles(self):
+        return os.listdir(self.profile_dir) if os.path.isdir(self.profile_dir) else []
+
+    def test_header(self):
+        with override_settings(PROFILER_DIR=self.profile_dir), mock.patch('cProfile.Profile') as profile:
+            for username, group in (('customer', 'Customer'), ('crew', 'Delivery Crew')):
+                with self.subTest(group=group):
+                    self.login(username, group)
+                    response = self.client.get('/api/menu-items/', HTTP_X_PROFILE='1')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotIn('X-Profile-Id', response)
+            self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+            self.assertEqual(self.client.get('/api/menu-items/', HTTP_X_PROFILE='1').status_code, 401)
+            # Not even profiled and thrown away
+            profile.assert_not_called()
+
+        self.login('manager', 'Manager')
+        with override_settings(PROFILER_DIR=self.profile_dir):
+            response = self.client.get('/api/menu-items/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profiles(), [response['X-Profile-Id']])
+
+    def test_view_exceptions(self):
+        _, token = create_user('manager', 'Manager')
+        request = APIRequestFactory().get('/api/menu-items/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {token}')
+
+        def view(request):
+            raise Http404
+
+        middleware = ProfilerMiddleware(lambda request: None)
+        with override_settings(PROFILER_DIR=self.profile_dir):
+            response = middleware.process_view(request, view, (), {})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.profiles(), [response['X-Profile-Id']])
+
+
+class TokenRevocationTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.login('customer', 'Customer')
+        self.assertEqual(self.client.get('/api/cart/menu-items/').status_code, 200)
+        self.version = token_cache.marker.version()
+
+    def test_unrelated_saves_keep_the_cache(self):
+        self.user.first_name = 'Bob'
+        self.user.save()
+        update_last_login(None, self.user)
+        self.assertEqual(token_cache.marker.version(), self.version)
+
+    def test_password_change(self):
+        self.user.set_password('lemon@new!')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertNotEqual(token_cache.marker.version(), self.version)
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['is_active'])
+        self.assertNotEqual(token_cache.marker.version(), self.version)
+        self.assertEqual(self.client.get('/api/cart/menu-items/').status_code, 401)
+
+    def test_logout(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Token.objects.filter(user=self.user).delete()
+            # Not before the delete commits
+            self.assertEqual(token_cache.marker.version(), self.version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.client.get('/api/cart/menu-items/').status_code, 401)
+
+    def test_revocation_during_a_miss(self):
+        token = Token.objects.get(user=self.user)
+        for revoke in (token_cache.revoke, token_cache.marker.bump):
+            with self.subTest(revoke=revoke):
+                version = token_cache.version()
+                self.assertIsNone(token_cache.get(version, 'unknown'))
+                # Revoked in this process or another between the miss and the insert
+                revoke()
+                token_cache.set(version, 'unknown', self.user, token)
+                self.assertIsNone(token_cache.get(token_cache.version(), 'unknown'))
+
+        version = token_cache.version()
+        token_cache.get(version, 'unknown')
+        token_cache.set(version, 'unknown', self.user, token)
+        self.assertEqual(token_cache.get(version, 'unknown'), (self.user, token))
+
+
+class RoleCacheTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.login('customer', 'Customer')
+        self.customers = Group.objects.get(name='Customer')
+        self.managers, _ = Group.objects.get_or_create(name='Manager')
+        self.assertEqual(self.roles(), {'Customer'})
+
+    def roles(self):
+        # What another request resolves: a fresh instance, through the shared cache
+        return get_user_roles(User.objects.get(pk=self.user.pk))
+
+    def assertInvalidatedOnCommit(self, change, roles):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            # Not before the change commits
+            self.assertEqual(self.roles(), {'Customer'})
+        self.assertEqual(self.roles(), roles)
+
+    def test_user_groups(self):
+        get_user_roles(self.user)
+        self.assertInvalidatedOnCommit(lambda: self.user.groups.add(self.managers), {'Customer', 'Manager'})
+        self.assertEqual(get_user_roles(self.user), {'Customer', 'Manager'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.clear()
+        self.assertEqual(self.roles(), set())
+
+    def test_group_members(self):
+        self.assertInvalidatedOnCommit(lambda: self.managers.user_set.add(self.user), {'Customer', 'Manager'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customers.user_set.remove(self.user)
+        self.assertEqual(self.roles(), {'Manager'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.managers.user_set.clear()
+        self.assertEqual(self.roles(), set())
+
+    def test_group_rename(self):
+        self.customers.name = 'Diner'
+        self.assertInvalidatedOnCommit(self.customers.save, {'Diner'})
+
+    def test_group_delete(self):
+        self.assertInvalidatedOnCommit(self.customers.delete, set())
+
+
+class OrderHistoryTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        menu = create_menu()
+        self.customer = User.objects.create_user(username='customer')
+        self.customer.groups.add(Group.objects.get_or_create(name='Customer')[0])
+        other = User.objects.create_user(username='other')
+        for user, day, delivered in ((self.customer, date(2024, 1, 1), True), (other, date(2024, 1, 2), True),
+                                     (self.customer, date(2024, 1, 3), False)):
+            order = Order.objects.create(user=user, status=delivered, total=Decimal('12.50'), date=day)
+            OrderItem.objects.create(order=order, menuitem=menu['Greek Salad'], quantity=1,
+                                     unit_price=Decimal('12.50'), price=Decimal('12.50'))
+        archive_orders(date(2024, 6, 1))
+
+    def test_history(self):
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/orders/history')
+        self.assertEqual([order['date'] for order in response.data['results']], ['2024-01-01'])
+        self.assertEqual(response.data['results'][0]['items'][0]['price'], '12.50')
+        self.assertEqual(self.client.get('/api/orders/history', {'cursor': cursor(['2024-01-01', {}])}).status_code, 404)
+
+    def test_export(self):
+        self.login('manager', 'Manager')
+        response = self.client.get('/api/orders/export', {'fmt': 'ndjson', 'from': '2024-01-02'})
+        self.assertEqual(response.status_code, 200)
+        orders = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(order['date'], order['status']) for order in orders], [('2024-01-02', True), ('2024-01-03', False)])
+        response = self.client.get('/api/orders/export', {'status': '0'})
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 2)
+
+    async def test_async_export(self):
+        await sync_to_async(self.login)('manager', 'Manager')
+        response = await self.async_client.get('/api/orders/export', {'fmt': 'ndjson'},
+                                               headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([json.loads(line)['date'] for line in content.decode().splitlines()],
+                         ['2024-01-01', '2024-01-02', '2024-01-03'])
+
+    def test_export_errors(self):
+        self.login('manager', 'Manager')
+        for params in ({'fmt': 'xml'}, {'from': '2024-13-01'}, {'status': 'yes'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/orders/export', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('message', response.data)
+
+
+class SeedTests(LittlemonTestCase):
+    def test_seed(self):
+        call_command('seed', categories=3, menu_items=20, users=30, managers=2, delivery_crew=3, carts=5,
+                     orders=200, days=30, stdout=io.StringIO())
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertEqual(Order.objects.order_by('-date').values_list('date', flat=True)[0], date(2025, 1, 1))
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), 200)
+        self.assertEqual(sum(MenuItemSales.objects.values_list('quantity', flat=True)),
+                         sum(OrderItem.objects.values_list('quantity', flat=True)))
+
+
+class AssignmentTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer, _ = create_user('customer', 'Customer')
+        self.crew = [create_user(f'crew{index}', 'Delivery Crew')[0] for index in range(2)]
+        inactive, _ = create_user('inactive', 'Delivery Crew')
+        inactive.is_active = False
+        inactive.save()
+        # crew0 already has an open order
+        self.order(self.crew[0])
+
+    def order(self, crew=None):
+        return Order.objects.create(user=self.customer, delivery_crew=crew, total=Decimal('5.00'), date=date(2025, 1, 1))
+
+    def loads(self):
+        return dict(Order.objects.filter(status=False).values('delivery_crew__username')
+                    .annotate(count=Count('id')).values_list('delivery_crew__username', 'count'))
+
+    def test_assign_pending_orders(self):
+        pending = [self.order() for _ in range(5)]
+        batches = []
+        with self.captureOnCommitCallbacks(execute=True):
+            assigned = assign_pending_orders(batch_size=2, on_batch=lambda count, seconds: batches.append(count))
+        self.assertEqual((assigned, batches), (5, [2, 2, 1]))
+        self.assertEqual(self.loads(), {'crew0': 3, 'crew1': 3})
+        self.assertEqual(OrderEvent.objects.filter(kind=OrderEvent.ASSIGNED).count(), 5)
+        self.assertEqual(assign_pending_orders(), 0)
+
+        Order.objects.filter(pk=pending[0].pk).update(delivery_crew=None)
+        call_command('assign_orders', stdout=io.StringIO())
+        self.assertEqual(self.loads(), {'crew0': 3, 'crew1': 3})
+
+    def test_no_crew(self):
+        self.order()
+        User.objects.filter(groups__name='Delivery Crew').update(is_active=False)
+        with self.assertLogs(assignment.logger, 'WARNING'):
+            self.assertEqual(assign_pending_orders(), 0)
+        self.assertEqual(Order.objects.filter(delivery_crew=None).count(), 1)
+
+    def test_worker_lock(self):
+        with override_settings(ORDER_ASSIGNMENT_LOCK_FILE=os.path.join(self.tmp_dir, 'assignment.lock')):
+            first, second = AssignmentWorker(1), AssignmentWorker(1)
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire())
+            # The process holding the lock exited
+            first.lock_file.close()
+            self.assertTrue(second.acquire())
+            second.lock_file.close()
+
+    def test_start_worker(self):
+        with mock.patch.object(assignment, '_worker', None), \
+                mock.patch.object(assignment, 'AssignmentWorker') as worker:
+            assignment.start_worker()
+            worker.assert_not_called()
+            with override_settings(ORDER_ASSIGNMENT_INTERVAL=5):
+                # No fcntl (Windows): the server runs without the worker
+                with mock.patch.object(assignment, 'fcntl', None), self.assertLogs(assignment.logger, 'WARNING'):
+                    assignment.start_worker()
+                worker.assert_not_called()
+                assignment.start_worker()
+                assignment.start_worker()
+            worker.assert_called_once_with(5)
+            worker.return_value.start.assert_called_once_with()
+
+
+class AsyncReadViewTests(LittlemonTestCase):
+    """
+    The async views answer like the DRF views they shadow
+    """
+    def setUp(self):
+        super().setUp()
+        menu = create_menu()
+        self.salad = menu['Greek Salad']
+        self.customer, self.customer_token = create_user('customer', 'Customer')
+        other, self.other_token = create_user('other', 'Customer')
+        self.crew, self.crew_token = create_user('crew', 'Delivery Crew')
+        _, self.manager_token = create_user('manager', 'Manager')
+        Cart.objects.create(user=self.customer, menuitem=self.salad, quantity=2, unit_price=self.salad.price,
+                            price=self.salad.price * 2)
+
+        self.orders = {}
+        for name, user, day, delivered in (('archived', self.customer, date(2024, 1, 1), True),
+                                           ('live', self.customer, date(2025, 1, 1), False),
+                                           ('other', other, date(2025, 1, 2), False)):
+            order = Order.objects.create(user=user, delivery_crew=self.crew, status=delivered, total=self.salad.price,
+                                         date=day)
+            OrderItem.objects.create(order=order, menuitem=self.salad, quantity=1, unit_price=self.salad.price,
+                                     price=self.salad.price)
+            self.orders[name] = order.pk
+        archive_orders(date(2024, 6, 1))
+
+    def assertSameResponse(self, path, token=None, params=None):
+        headers = {} if token is None else {'Authorization': f'Token {token}'}
+        expected = self.client.get(path, params, headers=headers)
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            response = async_to_sync(self.async_client.get)(path, params, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        for header in ('Allow', 'WWW-Authenticate', 'ETag'):
+            self.assertEqual(response.get(header), expected.get(header), header)
+        return response
+
+    def test_menu(self):
+        for params in ({}, {'page_size': 1}, {'page_size': 1, 'with_total': 1}):
+            with self.subTest(params=params):
+                self.assertSameResponse('/api/menu-items/', params=params)
+        self.assertSameResponse(f'/api/menu-items/{self.salad.pk}')
+        self.assertSameResponse('/api/menu-items/0')
+
+    def test_cart(self):
+        self.assertEqual(self.assertSameResponse('/api/cart/menu-items/', self.customer_token).status_code, 200)
+        self.assertEqual(self.assertSameResponse('/api/cart/menu-items/').status_code, 401)
+        self.assertEqual(self.assertSameResponse('/api/cart/menu-items/', 'invalid').status_code, 401)
+
+    def test_orders(self):
+        _, token = create_user('nobody')
+        self.assertEqual(self.assertSameResponse('/api/orders/', token).status_code, 403)
+        for token in (self.customer_token, self.other_token, self.crew_token, self.manager_token):
+            with self.subTest(token=token):
+                self.assertSameResponse('/api/orders/', token)
+                self.assertSameResponse('/api/orders/', token, {'page_size': 1, 'with_total': 1})
+        for name, status_code in (('archived', 200), ('live', 200), ('other', 403)):
+            with self.subTest(order=name):
+                response = self.assertSameResponse(f"/api/orders/{self.orders[name]}", self.customer_token)
+                self.assertEqual(response.status_code, status_code)
+        self.assertEqual(self.assertSameResponse('/api/orders/999999', self.customer_token).status_code, 404)
+        self.assertEqual(self.assertSameResponse('/api/orders/', params={'cursor': 'invalid'},
+                                                 token=self.customer_token).status_code, 404)
+
+
+@override_settings(DATABASE_ROUTERS=['LittlemonAPI.db.ReadReplicaRouter'])
+class ReadReplicaTests(LittlemonTestMixin, APITransactionTestCase):
+    """
+    With the router: the rows are committed, so that the replica
+    connection (here a mirror of the test database) can read them
+    """
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        super().setUp()
+        self.salad = create_menu()['Greek Salad']
+        self.login('customer', 'Customer')
+
+    def queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(*args, **kwargs)
+        return response, len(default), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        for path in ('/api/menu-items/', f'/api/menu-items/{self.salad.pk}', '/api/orders/', '/api/orders/history'):
+            with self.subTest(path=path):
+                response, default, replica = self.queries('get', path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(default, 0)
+                self.assertGreater(replica, 0)
+
+        # The cart isn't routed: customers read their own writes
+        response, default, replica = self.queries('get', '/api/cart/menu-items/')
+        self.assertEqual((response.status_code, replica), (200, 0))
+        self.assertGreater(default, 0)
+
+    def test_writes_go_to_default(self):
+        response, default, replica = self.queries('post', '/api/cart/menu-items/',
+                                                  {'menuitem_id': self.salad.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(default, 0)
+        self.assertEqual(replica, 0)
+        self.assertEqual(Cart.objects.using(REPLICA).count(), 1)
+
+    def test_replica_is_read_only(self):
+        # settings.py also opens it with mode=ro, which the in-memory test mirror can't keep
+        self.assertTrue(connections[REPLICA].settings_dict['READ_ONLY'])
+        with connections[REPLICA].cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone(), (1,))
+            with self.assertRaises(OperationalError):
+                cursor.execute(f'DELETE FROM {MenuItem._meta.db_table}')
+        self.assertEqual(MenuItem.objects.count(), 3)
+
+
+class OrderFeedTests(LittlemonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer, self.customer_token = create_user('customer', 'Customer')
+        other, _ = create_user('other', 'Customer')
+        self.crew, self.crew_token = create_user('crew', 'Delivery Crew')
+        self.other_crew, self.other_crew_token = create_user('other-crew', 'Delivery Crew')
+        _, self.manager_token = create_user('manager', 'Manager')
+
+        self.order = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=5, date=date(2025, 1, 1))
+        other_order = Order.objects.create(user=other, total=5, date=date(2025, 1, 1))
+        record_order_event(OrderEvent.CREATED, self.order)
+        record_order_event(OrderEvent.CREATED, other_order)
+        self.order.delivery_crew = self.other_crew
+        self.order.save()
+        record_order_event(OrderEvent.ASSIGNED, self.order, self.crew.pk)
+        self.events = list(OrderEvent.objects.order_by('id').values_list('id', flat=True))
+
+    def get(self, token, **params):
+        # wait=0: the same answers from the async long-poll (AsyncOrderFeedTests)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return self.client.get('/api/orders/events', {'wait': 0, **params}).json()
+
+    def test_starts_at_the_latest_event(self):
+        data = self.get(self.customer_token)
+        self.assertEqual(data, {'events': [], 'cursor': self.events[-1]})
+
+    def test_visibility(self):
+        created, other_created, assigned = self.events
+        for token, visible in ((self.customer_token, [created, assigned]),
+                               (self.crew_token, [created, assigned]),
+                               (self.other_crew_token, [assigned]),
+                               (self.manager_token, [created, other_created, assigned])):
+            with self.subTest(visible=visible):
+                data = self.get(token, since=0)
+                self.assertEqual([event['id'] for event in data['events']], visible)
+                # The cursor moves past the events the user can't see
+                self.assertEqual(data['cursor'], assigned)
+
+    @override_settings(ORDER_FEED_BATCH=2)
+    def test_batches(self):
+        data = self.get(self.manager_token, since=0)
+        self.assertEqual([event['id'] for event in data['events']], self.events[:2])
+        self.assertEqual(data['cursor'], self.events[1])
+        data = self.get(self.manager_token, since=data['cursor'])
+        self.assertEqual([event['id'] for event in data['events']], self.events[2:])
+        self.assertEqual(self.get(self.manager_token, since=self.events[-1])['events'], [])
+
+    def test_invalid_cursor(self):
+        for since in ('-1', 'abc'):
+            with self.subTest(since=since):
+                self.assertIn('since', self.get(self.customer_token, since=since))
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/orders/events').status_code, 401)
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLCONF, ORDER_FEED_POLL_INTERVAL=0.02)
+class AsyncOrderFeedTests(OrderFeedTests):
+    async def aget(self, token, params, **headers):
+        return await self.async_client.get('/api/orders/events', params,
+                                           headers={'Authorization': f'Token {token}', **headers})
+
+    async def test_long_poll_times_out(self):
+        start = time.monotonic()
+        response = await self.aget(self.customer_token, {'since': self.events[-1], 'wait': 0.2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'events': [], 'cursor': self.events[-1]})
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    async def test_long_poll_wakes_up_on_a_new_event(self):
+        async def deliver():
+            await asyncio.sleep(0.1)
+            self.order.status = True
+            await sync_to_async(record_order_event)(OrderEvent.STATUS, self.order)
+            # The test's transaction never commits, so bump the marker ourselves
+            order_feed.bump()
+
+        start = time.monotonic()
+        response, _ = await asyncio.gather(
+            self.aget(self.customer_token, {'since': self.events[-1], 'wait': 10}),
+            deliver(),
+        )
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([event['kind'] for event in response.json()['events']], [OrderEvent.STATUS])
+
+    async def test_invalid_wait(self):
+        for wait in ('nan', 'NaN', 'inf', '-inf', 'abc'):
+            with self.subTest(wait=wait):
+                response = await self.aget(self.customer_token, {'wait': wait})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('wait', response.json())
+
+    @override_settings(ORDER_FEED_KEEPALIVE=0.05, ORDER_FEED_STREAM_SECONDS=0.3)
+    async def test_server_sent_events(self):
+        response = await self.aget(self.crew_token, {'since': 0}, Accept='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = [message async for message in response.streaming_content]
+        self.assertEqual(messages[0], b'retry: 2000\n\n')
+        created, _, assigned = self.events
+        self.assertTrue(messages[1].startswith(f'id: {created}\nevent: created\ndata: '.encode()))
+        self.assertTrue(messages[2].startswith(f'id: {assigned}\nevent: assigned\n'.encode()))
+        # Then keep-alives carrying the cursor, until the stream ends
+        self.assertEqual(set(messages[3:]), {f'id: {assigned}\n\n'.encode()})
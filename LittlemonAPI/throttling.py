@@ -0,0 +1,154 @@
+"""
+Sliding-window throttles shared by every worker process on the host.
+
+DRF's throttles keep a list of timestamps per client in the default
+cache, which is per process and grows with the rate. These throttles keep
+two counters per client (current and previous fixed window) in a small
+SQLite file and estimate the sliding window from them, so each check is
+one row read and one row write whatever the rate is.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import (
+    SimpleRateThrottle, UserRateThrottle, AnonRateThrottle, ScopedRateThrottle,
+)
+
+PRUNE_PROBABILITY = 0.001
+
+
+class SlidingWindowStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA mmap_size=8388608')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS throttle ('
+                ' key TEXT PRIMARY KEY,'
+                ' window INTEGER NOT NULL,'
+                ' current INTEGER NOT NULL,'
+                ' previous INTEGER NOT NULL,'
+                ' expires REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def hit(self, key, limit, duration, now):
+        """
+        Records a request for key if it fits in the window.
+
+        Returns (allowed, wait) where wait is the number of seconds until
+        the next request would be allowed (None when allowed).
+        """
+        window = int(now // duration)
+        elapsed = now - window * duration
+        conn = self._connection()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT window, current, previous FROM throttle WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[0] < window - 1:
+                current, previous = 0, 0
+            elif row[0] == window - 1:
+                current, previous = 0, row[1]
+            else:
+                current, previous = row[1], row[2]
+
+            estimate = previous * (1 - elapsed / duration) + current
+            if estimate + 1 > limit:
+                conn.execute('COMMIT')
+                return False, self._wait(limit, duration, elapsed, current, previous)
+
+            conn.execute(
+                'INSERT OR REPLACE INTO throttle (key, window, current, previous, expires) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, window, current + 1, previous, (window + 2) * duration),
+            )
+            if random.random() < PRUNE_PROBABILITY:
+                conn.execute('DELETE FROM throttle WHERE expires < ?', (now,))
+            conn.execute('COMMIT')
+            return True, None
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _wait(limit, duration, elapsed, current, previous):
+        remaining = duration - elapsed
+        if current + 1 > limit or not previous:
+            return remaining
+        # Time until the previous window's weight has decayed enough
+        wait = duration * (1 - (limit - 1 - current) / previous) - elapsed
+        return min(max(wait, 0), remaining)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    path = getattr(
+        settings, 'THROTTLE_DB_PATH',
+        os.path.join(tempfile.gettempdir(), 'littlemon-throttle.sqlite3'),
+    )
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = SlidingWindowStore(path)
+    return _store
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    def get_rate(self):
+        # Read the rates at request time so settings overrides apply
+        if not getattr(self, 'scope', None):
+            return None
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.wait_time = get_store().hit(
+            self.key, self.num_requests, self.duration, self.timer()
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class SharedUserRateThrottle(UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class SharedAnonRateThrottle(AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class SharedScopedRateThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    """
+    Throttles views by their `throttle_scope` attribute (views without one
+    are not limited by this class)
+    """
+    pass
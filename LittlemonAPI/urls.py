@@ -1,19 +1,41 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
 
-urlpatterns = [
-    path('menu-items/', views.MenuItemListCreateView.as_view(), name='menu-item-list'),
-    path('menu-items/<int:pk>', views.MenuItemRetrieveUpdateDeleteView.as_view(), name='menu-item-detail'),
 
-    path('cart/menu-items/', views.CartCustomerView.as_view()),
+def get_urlpatterns(async_reads=False):
+    """
+    With async_reads (under ASGI) the hot GET endpoints are served by the
+    async views, which pass everything else on to the DRF views
+    """
+    def read_view(view, async_view):
+        return (async_view if async_reads else view).as_view()
 
-    path('groups/manager/users/', views.ManagerUserGroupView.as_view()),
-    path('groups/manager/users/<int:userId>', views.ManagerUserGroupView.as_view()),
+    return [
+        path('menu-items/', read_view(views.MenuItemListCreateView, async_views.MenuItemListView), name='menu-item-list'),
+        path('menu-items/<int:pk>', read_view(views.MenuItemRetrieveUpdateDeleteView, async_views.MenuItemDetailView), name='menu-item-detail'),
+        path('menu-items/import', views.MenuImportView.as_view(), name='menu-item-import'),
+        path('menu-items/export', views.MenuExportView.as_view(), name='menu-item-export'),
 
-    path('groups/delivery-crew/users/', views.DeliveryUserGroupView.as_view()),
-    path('groups/delivery-crew/users/<int:userId>', views.DeliveryUserGroupView.as_view()),
+        path('cart/menu-items/', read_view(views.CartCustomerView, async_views.CartView)),
 
-    path('orders/', views.OrderCustomerView.as_view()),
-    path('orders/<int:orderId>', views.OrderCustomerView.as_view()),
+        path('groups/manager/users/', views.ManagerUserGroupView.as_view()),
+        path('groups/manager/users/<int:userId>', views.ManagerUserGroupView.as_view()),
 
-]
\ No newline at end of file
+        path('groups/delivery-crew/users/', views.DeliveryUserGroupView.as_view()),
+        path('groups/delivery-crew/users/<int:userId>', views.DeliveryUserGroupView.as_view()),
+
+        path('orders/', read_view(views.OrderCustomerView, async_views.OrderView)),
+        path('orders/<int:orderId>', read_view(views.OrderCustomerView, async_views.OrderView)),
+        path('orders/history', views.OrderHistoryView.as_view(), name='order-history'),
+        path('orders/export', views.OrderExportView.as_view(), name='order-export'),
+        path('orders/batch', views.OrderBatchView.as_view(), name='order-batch'),
+        path('orders/events', read_view(views.OrderEventView, async_views.OrderEventFeedView), name='order-events'),
+
+        path('analytics/sales', views.SalesAnalyticsView.as_view(), name='sales-analytics'),
+
+        path('metrics', views.MetricsView.as_view(), name='metrics'),
+    ]
+
+
+urlpatterns = get_urlpatterns(getattr(settings, 'ASYNC_READ_VIEWS', False))
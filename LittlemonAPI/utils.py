@@ -1,5 +1,75 @@
 # utils.py (or in a utilities file)
-from django.contrib.auth.models import User
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+ROLE_CACHE_ALIAS = 'shared'
+
+
+def _role_cache_key(user_id):
+    return f'littlemon:roles:{user_id}'
+
+
+def get_user_roles(user):
+    """
+    Returns the names of the groups a user belongs to
+
+    The set is resolved once per request (it is kept on the user instance)
+    and shared between processes through the cross-process cache, so the
+    permission classes and the views never query the groups table twice.
+
+    Args:
+        user (User): The user to resolve
+
+    Returns:
+        frozenset: The group names of the user (empty for anonymous users)
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        cache = caches[ROLE_CACHE_ALIAS]
+        names = cache.get(_role_cache_key(user.pk))
+        if names is None:
+            names = list(user.groups.values_list('name', flat=True))
+            cache.set(_role_cache_key(user.pk), names, getattr(settings, 'ROLE_CACHE_TIMEOUT', 300))
+        roles = frozenset(names)
+        user._roles = roles
+    return roles
+
+
+async def aget_user_roles(user):
+    """
+    Async version of get_user_roles, for the async views
+
+    Once it has run, get_user_roles() (and so the permission classes)
+    answers from the user instance without any I/O.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        cache = caches[ROLE_CACHE_ALIAS]
+        names = await cache.aget(_role_cache_key(user.pk))
+        if names is None:
+            names = [name async for name in user.groups.values_list('name', flat=True)]
+            await cache.aset(_role_cache_key(user.pk), names, getattr(settings, 'ROLE_CACHE_TIMEOUT', 300))
+        roles = frozenset(names)
+        user._roles = roles
+    return roles
+
+
+def invalidate_user_roles(user_ids):
+    """
+    Drops the cached roles of the given users
+    """
+    caches[ROLE_CACHE_ALIAS].delete_many([_role_cache_key(user_id) for user_id in user_ids])
+
 
 def is_user_in_group(user, group_name):
     """
@@ -12,4 +82,36 @@ def is_user_in_group(user, group_name):
     Returns:
         bool: True if the user is in the group, False otherwise
     """
-    return user.groups.filter(name=group_name).exists()
\ No newline at end of file
+    return group_name in get_user_roles(user)
+
+
+class FileVersionMarker:
+    """
+    A version number shared by every process on the host
+
+    The version is the random token stored in the marker file, so checking
+    it costs reading a few bytes and never touches the database. Unlike
+    the file's inode and mtime, a new token can't repeat an old version.
+    """
+    def __init__(self, setting_name, filename):
+        self.setting_name = setting_name
+        self.filename = filename
+
+    @property
+    def path(self):
+        return getattr(settings, self.setting_name, os.path.join(tempfile.gettempdir(), self.filename))
+
+    def version(self):
+        try:
+            with open(self.path) as marker:
+                return marker.read()
+        except FileNotFoundError:
+            self.bump()
+            return self.version()
+
+    def bump(self):
+        # Readers see the old token or the new one, never a partial write
+        tmp_path = f'{self.path}.{uuid.uuid4().hex}'
+        with open(tmp_path, 'w') as marker:
+            marker.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.path)
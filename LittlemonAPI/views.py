@@ -3,21 +3,48 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework import status, generics
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User, Group
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.db import transaction
-from decimal import Decimal
-from datetime import datetime
-
-from .utils import is_user_in_group
+from django.db.models import F, Prefetch, Sum
+from django.utils.http import parse_etags
+from django_filters.rest_framework import DjangoFilterBackend
+from collections import defaultdict
+import io
+from datetime import datetime, date, timedelta
+
+from .utils import get_user_roles
 from .permissions import IsManager, IsCustomer, IsDeliveryCrew, IsCustomerOrManagerOrDeliveryCrew, IsManagerOrDeliveryCrew
-from .serializers import UserSerializer, MenuItemSerializer, CartSerializer, OrderSerializer, OrderItemSerializer
-from .models import MenuItem, Cart, Category, Order, OrderItem
+from .serializers import UserSerializer, MenuItemSerializer, CartSerializer, OrderSerializer
+from .models import (MenuItem, Cart, Category, Order, OrderItem, OrderEvent, DailySales, MenuItemSales, CategorySales,
+                     ArchivedOrder)
+from .menu_cache import menu_catalog, bump_menu_version
+from .throttling import SharedAnonRateThrottle, SharedScopedRateThrottle
+from .filters import OrderFilter
+from .pagination import MenuItemKeysetPagination, OrderKeysetPagination
+from .search import MenuItemSearchFilter, RankedOrderingFilter
+from .menu_io import FORMATS, CONTENT_TYPES, import_menu, export_menu
+from .fast_serializers import (menu_item_reader, cart_reader, order_reader, order_item_reader, archived_order_reader,
+                               archived_order_item_reader)
+from .metrics import InstrumentedViewMixin, registry, render_prometheus
+from .db import ReadOnlyViewMixin
+from .order_feed import fetch_events, parse_since, record_order_event, record_order_events
+from .idempotency import idempotent
+from . import order_export
+from . import rollups
 
 
 # Class View for managing menu Item
-class MenuItemListCreateView(generics.ListCreateAPIView):
-    queryset = MenuItem.objects.all()
+class MenuItemListCreateView(InstrumentedViewMixin, ReadOnlyViewMixin, generics.ListCreateAPIView):
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
+    pagination_class = MenuItemKeysetPagination
+    filter_backends = [DjangoFilterBackend, MenuItemSearchFilter, RankedOrderingFilter]
+    throttle_classes = [SharedAnonRateThrottle, SharedScopedRateThrottle]
+    throttle_scope = 'menu'
 
     ordering_fields = ['price', 'title', 'category__title']
     search_fields = ['title', 'category__title', 'category__slug']
@@ -28,6 +55,26 @@ class MenuItemListCreateView(generics.ListCreateAPIView):
         if self.request.method == 'POST':
             return [IsManager()]
         return []
+
+    def list(self, request, *args, **kwargs):
+        # Serve the catalog from the versioned cache; a matching If-None-Match
+        # is answered with 304 before the queryset is even built.
+        version = menu_catalog.version()
+        key = f'{request.accepted_renderer.format}|{request.build_absolute_uri()}'
+        etag = menu_catalog.etag(version, key)
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in if_none_match or etag in [tag.removeprefix('W/') for tag in if_none_match]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = menu_catalog.get(version, key)
+        if data is None:
+            # Read path compiled from MenuItemSerializer, straight from .values() rows
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(menu_item_reader.values(queryset))
+            data = self.get_paginated_response(menu_item_reader.render(page)).data
+            menu_catalog.set(version, key, data)
+        return Response(data, headers={'ETag': etag})
     
     def post(self, request, *args, **kwargs):
         serializer_item = MenuItemSerializer(data=request.data)
@@ -36,38 +83,92 @@ class MenuItemListCreateView(generics.ListCreateAPIView):
         return Response(data=serializer_item.data, status=status.HTTP_201_CREATED)
 
 
-class MenuItemRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+class MenuItemRetrieveUpdateDeleteView(InstrumentedViewMixin, ReadOnlyViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
     lookup_field = 'pk'
+    throttle_classes = [SharedAnonRateThrottle, SharedScopedRateThrottle]
+    throttle_scope = 'menu'
 
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             return ([IsManager()])
         return [IsAuthenticated()]
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        transaction.on_commit(bump_menu_version)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        transaction.on_commit(bump_menu_version)
+
+
+# Class Views for bulk loading and dumping the menu (managers only)
+class MenuImportView(InstrumentedViewMixin, APIView):
+    def get_permissions(self):
+        return [IsManager()]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"message": "Upload the menu as a 'file' field"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.query_params.get('fmt') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if fmt not in FORMATS:
+            return Response({"message": f"fmt should be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            summary = import_menu(stream, fmt)
+        except UnicodeDecodeError:
+            return Response({"message": "The file should be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class MenuExportView(InstrumentedViewMixin, APIView):
+    def get_permissions(self):
+        return [IsManager()]
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('fmt', 'csv')
+        if fmt not in FORMATS:
+            return Response({"message": f"fmt should be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_menu(fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="menu.{fmt}"'
+        return response
+
+
+CART_BATCH_MAX_ITEMS = 500
+
 
 # Class View for managing Customer Cart
-class CartCustomerView(APIView):
+class CartCustomerView(InstrumentedViewMixin, APIView):
     def get_permissions(self):
         return ([IsCustomer()])
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user).select_related('menuitem')
-    
-    def get(self, request, *args, **kwargs):
-        cart_items = self.get_queryset()
-        serializer = CartSerializer(cart_items, many=True)
+        return Cart.objects.filter(user=self.request.user).select_related('user', 'menuitem__category')
+
+    def get_cart_data(self):
+        cart_items = list(cart_reader.values(self.get_queryset()))
 
-        total = sum(item.price for item in cart_items)
-        cart_data = {
-            'items' : serializer.data,
+        total = sum(item['price'] for item in cart_items)
+        return {
+            'items' : cart_reader.render(cart_items),
             'total' : total
         }
-
-        return Response(cart_data, status=status.HTTP_200_OK)
     
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_cart_data(), status=status.HTTP_200_OK)
+    
+    @idempotent
     def post(self, request, *args, **kwargs):
+        # A list of {menuitem_id, quantity} syncs a whole basket at once
+        if isinstance(request.data, list):
+            return self.post_batch(request)
+
         menuitem_id = request.data.get('menuitem_id')
         quantity =  request.data.get('quantity', 1)
         
@@ -75,28 +176,50 @@ class CartCustomerView(APIView):
             return Response({"error": "menuitem_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            menuitem = MenuItem.objects.get(id=menuitem_id)
-        except MenuItem.DoesNotExist:
-            return Response({"error": "menuitem not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            menuitem=menuitem,
-            defaults={
-                'quantity': quantity,
-                'unit_price': menuitem.price,
-                'price': Decimal(str(menuitem.price)) * Decimal(quantity)
-            }
-        )
+            menuitem_id, quantity = int(menuitem_id), int(quantity)
+        except (TypeError, ValueError):
+            return Response({"error": "menuitem_id and quantity should be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity < 1:
+            return Response({"error": "Quantity should be at least 1"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not created:
-            cart_item.quantity += int(quantity)
-            cart_item.price = cart_item.quantity * cart_item.unit_price
-            cart_item.save() 
+        if not Cart.objects.add_items(request.user, {menuitem_id: quantity}):
+            return Response({"error": "menuitem not found"}, status=status.HTTP_404_NOT_FOUND)
 
+        cart_item = self.get_queryset().get(menuitem_id=menuitem_id)
         serializer = CartSerializer(cart_item)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
+    def post_batch(self, request):
+        if len(request.data) > CART_BATCH_MAX_ITEMS:
+            return Response({"error": f"A batch can hold at most {CART_BATCH_MAX_ITEMS} items"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Merge the entries so each menu item is written once
+        quantities = defaultdict(int)
+        errors = {}
+        for index, entry in enumerate(request.data):
+            try:
+                menuitem_id, quantity = int(entry['menuitem_id']), int(entry.get('quantity', 1))
+            except (TypeError, ValueError, KeyError):
+                errors[index] = "menuitem_id is required and quantity should be an integer"
+                continue
+            if quantity < 1:
+                errors[index] = "Quantity should be at least 1"
+                continue
+            quantities[menuitem_id] += quantity
+
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            found = set(MenuItem.objects.filter(id__in=quantities).values_list('id', flat=True))
+            missing = sorted(set(quantities) - found)
+            if missing:
+                return Response({"error": "menuitem not found", "menuitem_ids": missing}, status=status.HTTP_404_NOT_FOUND)
+
+            Cart.objects.add_items(request.user, quantities)
+
+        return Response(self.get_cart_data(), status=status.HTTP_201_CREATED)
+
     def delete(self, request, *args, **kwargs):
         self.get_queryset().delete()
         return Response({"message": "Cart Emptied"}, status=status.HTTP_204_NO_CONTENT)
@@ -105,7 +228,7 @@ class CartCustomerView(APIView):
 # Class View for managing user groups (Manager Group)
 from .permissions import IsManagerOrAdmin
 
-class ManagerUserGroupView(APIView):
+class ManagerUserGroupView(InstrumentedViewMixin, APIView):
     def get_permissions(self):
         if self.request.method == 'GET':
             return ([IsManagerOrAdmin()])
@@ -143,7 +266,7 @@ class ManagerUserGroupView(APIView):
             user = User.objects.get(id=user_id)
             group = Group.objects.get(name='Manager')
 
-            if not is_user_in_group(user, 'Manager').exists():
+            if 'Manager' not in get_user_roles(user):
                 return Response({"message": f"The user {user_id} don't belong to the Manager Group"}, status.HTTP_400_BAD_REQUEST)
 
             user.groups.remove(group)
@@ -154,7 +277,7 @@ class ManagerUserGroupView(APIView):
 
 
 # Class View for managing user groups (Delivery Crew Group)
-class DeliveryUserGroupView(APIView):
+class DeliveryUserGroupView(InstrumentedViewMixin, APIView):
     def get_permissions(self):
         return ([IsManager()])
     
@@ -194,7 +317,7 @@ class DeliveryUserGroupView(APIView):
             user = User.objects.get(id=user_id)
             group = Group.objects.get(name='Delivery Crew')
 
-            if not is_user_in_group(user, 'Delivery Crew').exists():
+            if 'Delivery Crew' not in get_user_roles(user):
                 return Response({"message": f"The user {user_id} don't belong to the Delivery Crew Group"}, status.HTTP_400_BAD_REQUEST)
 
             user.groups.remove(group)
@@ -204,8 +327,22 @@ class DeliveryUserGroupView(APIView):
             return Response({"message": "User not found"}, status.HTTP_404_NOT_FOUND)
 
 
+# Prefetch plan for orders rendered through OrderSerializer: one query for the
+# orders (user and delivery crew joined) and one for all their items (menu item
+# joined). Listings read the same data through order_reader.
+ORDER_ITEMS_PREFETCH = Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('menuitem').order_by('order_id', 'id'))
+
+def orders_with_items():
+    return Order.objects.select_related('user', 'delivery_crew').prefetch_related(ORDER_ITEMS_PREFETCH)
+
+
 # Class View for managing Orders
-class OrderCustomerView(APIView):
+class OrderCustomerView(InstrumentedViewMixin, ReadOnlyViewMixin, APIView):
+
+    @property
+    def throttle_scope(self):
+        # Checkout gets its own, stricter budget on top of the user rate
+        return 'checkout' if self.request.method == 'POST' else None
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -218,86 +355,112 @@ class OrderCustomerView(APIView):
             return [IsManagerOrDeliveryCrew()]
         return []
          
+    # Where GET /api/orders/<id> looks for a customer's order: the live orders,
+    # then the archive, which keeps the old delivered ones (see archive.py).
+    # Shared with async_views.OrderView, like the two methods below.
+    order_sources = ((Order, order_item_reader), (ArchivedOrder, archived_order_item_reader))
+
+    def get_orders(self, user, query_params):
+        """
+        The orders listed to the user: their own, the ones they deliver, or
+        every order (with the OrderFilter filters) for managers
+        """
+        roles = get_user_roles(user)
+        if "Customer" in roles:
+            return orders_with_items().filter(user=user)
+        if "Manager" in roles:
+            filterset = OrderFilter(query_params, queryset=orders_with_items())
+            if not filterset.is_valid():
+                raise ValidationError(filterset.errors)
+            return filterset.qs
+        return orders_with_items().filter(delivery_crew=user)
+
+    def order_access_error(self, order, user):
+        """
+        The response refusing `order` (its user_id row, None when it doesn't
+        exist) to a customer, or None when it is theirs
+        """
+        if order is None:
+            return Response({"message": "Order not found"}, status.HTTP_404_NOT_FOUND)
+        if order['user_id'] != user.pk:
+            return Response({"message": "You don't have acces to this order. You can only access Your order"}, status.HTTP_403_FORBIDDEN)
+        return None
+
     def get(self, request, *args, **kwargs):
-        order_id = kwargs.get('orderId') 
-        current_user = request.user
+        order_id = kwargs.get('orderId')
 
-        if is_user_in_group(current_user, "Customer").exists(): # If user is Customer
-            if order_id:
-                try:
-                    order = Order.objects.get(id=order_id)
-
-                    if order.user != current_user:
-                        return Response({"message": "You don't have acces to this order. You can only access Your order"}, status.HTTP_403_FORBIDDEN)
-
-                    order_items = OrderItem.objects.filter(order=order).select_related('menuitem')
-                    serializer = OrderItemSerializer(order_items, many=True)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-                
-                except Order.DoesNotExist:
-                    return Response({"message": "Order not found"}, status.HTTP_404_NOT_FOUND)
-            else:   
-                orders = Order.objects.filter(user=request.user)
-            
-        elif is_user_in_group(current_user, "Manager").exists(): # If user is Manager
-            orders = Order.objects.all().select_related('user')
-        
-        elif is_user_in_group(current_user, "Delivery Crew").exists(): # If User is from Delivery Crew
-            orders = Order.objects.filter(delivery_crew=request.user)
-            
-        serializer = OrderSerializer(orders, many=True)        
-        return Response(serializer.data, status=status.HTTP_200_OK)
-   
-    @transaction.atomic
-    def post(self, request, *args, **kwargs):
-        # Get current user
-        current_user = request.user
+        if order_id and "Customer" in get_user_roles(request.user):
+            for model, reader in self.order_sources:
+                order = model.objects.filter(id=order_id).values('user_id').first()
+                if order is not None:
+                    break
+            error = self.order_access_error(order, request.user)
+            if error is not None:
+                return error
+            items = reader.values(reader.model.objects.filter(order_id=order_id))
+            return Response(reader.render(items), status=status.HTTP_200_OK)
+
+        orders = self.get_orders(request.user, request.query_params)
+        paginator = OrderKeysetPagination()
+        page = paginator.paginate_queryset(order_reader.values(orders), request, view=self)
+        return paginator.get_paginated_response(order_reader.render(page))
 
-        # Savoing point for rollback
-        sid = transaction.savepoint()
+    @transaction.atomic
+    def create_order_from_cart(self, user):
+        """
+        Turns the user's cart into an order with a fixed number of queries.
+        Returns None when the cart is empty.
+        """
+        # Get items on cart from the current user
+        cart_items = Cart.objects.filter(user=user)
+
+        # Total computed by the database, so the order is inserted only once
+        total = cart_items.aggregate(total=Sum('price'))['total']
+        if total is None:
+            return None
+
+        lines = list(cart_items.values_list('menuitem_id', 'quantity', 'unit_price', 'price'))
+
+        # Create new order table
+        new_order = Order.objects.create(
+            user= user,
+            status= False,
+            total= total,
+            date= datetime.now().date()
+        )
 
-        try:
-            # Get items on cart from the current user
-            cart_items = Cart.objects.filter(user=current_user).select_related('menuitem')
-            if not cart_items.exists():
-                transaction.savepoint_rollback(sid)
-                return Response({'message': 'Empty Card.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Create new order table
-            new_order = Order.objects.create(
-                user= current_user,
-                status= False,
-                total= 0,
-                date= datetime.now().date()
+        # All the cart lines become OrderItem records in bulk
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=new_order,
+                menuitem_id=menuitem_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                price=price
             )
+            for menuitem_id, quantity, unit_price, price in lines
+        ])
+        record_order_event(OrderEvent.CREATED, new_order)
+        rollups.add_order(new_order.date, total, [(menuitem_id, quantity, price) for menuitem_id, quantity, _, price in lines])
 
-            # For each cart item : create a new record in OrderItem table
-            total=0 # Total variable to store the total price of an order
-            for item in cart_items:
-                item_dict = {
-                    'order' : new_order,
-                    'menuitem' : item.menuitem,
-                    'quantity' : item.quantity,
-                    'unit_price' : item.unit_price,
-                    'price' : item.price
-                }
-                total += item.price
-                OrderItem.objects.create(**item_dict)
-
-            # Updating the total in the Order
-            new_order.total = total
-            new_order.save()
-
-            # Flushing the cart of the user
-            cart_items.delete()
-
-            # Display the results
-            serializer = OrderSerializer(new_order)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
+        # Flushing the cart of the user
+        cart_items.delete()
+        return new_order
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        try:
+            new_order = self.create_order_from_cart(request.user)
         except Exception as e:
-            transaction.savepoint_rollback(sid)
             return Response({'message': f"An Error Occured: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if new_order is None:
+            return Response({'message': 'Empty Card.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Display the results, once the write lock has been released
+        new_order = orders_with_items().get(pk=new_order.pk)
+        serializer = OrderSerializer(new_order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
         
     def delete(self, request, *args, **kwargs):
         order_id = kwargs.get('orderId')
@@ -306,7 +469,12 @@ class OrderCustomerView(APIView):
         else:
             try:
                 order = Order.objects.get(id=order_id)
-                order.delete()
+                with transaction.atomic():
+                    record_order_event(OrderEvent.DELETED, order)
+                    rollups.remove_order(order.date, order.total, list(
+                        OrderItem.objects.filter(order=order).values_list('menuitem_id', 'quantity', 'price')
+                    ), order.status)
+                    order.delete()
                 return Response("", status=status.HTTP_204_NO_CONTENT)
             except Order.DoesNotExist:
                 return Response({'message': f"Order not Found"}, status=status.HTTP_404_NOT_FOUND)
@@ -316,6 +484,7 @@ class OrderCustomerView(APIView):
         status_value = bool(int(request.data.get('status')))
         delivery_crew_id = request.data.get('delivery_crew_id')
         current_user = request.user
+        roles = get_user_roles(current_user)
 
         if not order_id:
             return Response({'message': "You need to specify an order"}, status=status.HTTP_400_BAD_REQUEST)
@@ -326,24 +495,30 @@ class OrderCustomerView(APIView):
             return Response({'message': "Order Not Found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Cas 1 : Manager peut assigner un livreur
-        if is_user_in_group(current_user, "Manager") and delivery_crew_id:
+        if "Manager" in roles and delivery_crew_id:
             try:
                 delivery_user = User.objects.get(id=delivery_crew_id)
+                previous_crew_id = order.delivery_crew_id
                 order.delivery_crew = delivery_user
-                order.save()
+                with transaction.atomic():
+                    order.save()
+                    record_order_event(OrderEvent.ASSIGNED, order, previous_crew_id)
                 serializer = OrderSerializer(order)
                 return Response({'message': "Delivery user assigned", "order": serializer.data}, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 return Response({'message': "Delivery User Not Found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Cas 2 : Manager ou livreur peut mettre à jour le statut
-        if is_user_in_group(current_user, "Manager") or is_user_in_group(current_user, "Delivery Crew"):
-            if order.delivery_crew != current_user and not is_user_in_group(current_user, "Manager"):
+        if "Manager" in roles or "Delivery Crew" in roles:
+            if order.delivery_crew != current_user and "Manager" not in roles:
                 return Response({'message': "You can't modify this order"}, status=status.HTTP_403_FORBIDDEN)
             if status_value is not None:
+                was_delivered = order.status
                 order.status = status_value
-                print(bool(status_value))
-                order.save()
+                with transaction.atomic():
+                    order.save()
+                    record_order_event(OrderEvent.STATUS, order)
+                    rollups.update_delivered(order.date, was_delivered, order.status)
                 serializer = OrderSerializer(order)
                 return Response({'message': "Order status updated", "order": serializer.data}, status=status.HTTP_200_OK)
 
@@ -357,8 +532,214 @@ class OrderCustomerView(APIView):
         except Order.DoesNotExist:
             return Response({'message': "Order Not Found"}, status=status.HTTP_404_NOT_FOUND)
 
+        previous_crew_id, was_delivered = order.delivery_crew_id, order.status
         serializer = OrderSerializer(order, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                record_order_event(OrderEvent.UPDATED, order, previous_crew_id)
+                rollups.update_delivered(order.date, was_delivered, order.status)
             return Response({'message': "Order updated successfully", "order": serializer.data}, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+ORDER_BATCH_MAX_ORDERS = 500
+
+
+def is_id(value):
+    """
+    True for an id sent as an integer (not a boolean) or a string of digits
+    """
+    if isinstance(value, str):
+        return value.isascii() and value.isdigit()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# Class View updating many orders at once, e.g. a driver closing out a route:
+# one ownership query and one UPDATE for the whole batch, all or nothing
+class OrderBatchView(InstrumentedViewMixin, APIView):
+    def get_permissions(self):
+        return [IsManagerOrDeliveryCrew()]
+
+    def patch(self, request, *args, **kwargs):
+        is_manager = "Manager" in get_user_roles(request.user)
+        data = request.data if isinstance(request.data, dict) else {}
+
+        order_ids = data.get('orders')
+        if not isinstance(order_ids, list) or not order_ids:
+            return Response({"message": "orders should be a list of order ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(order_ids) > ORDER_BATCH_MAX_ORDERS:
+            return Response({"message": f"A batch can hold at most {ORDER_BATCH_MAX_ORDERS} orders"}, status=status.HTTP_400_BAD_REQUEST)
+        # int() would also take 1.9, True or " 1"
+        if not all(is_id(order_id) for order_id in order_ids):
+            return Response({"message": "orders should be a list of order ids"}, status=status.HTTP_400_BAD_REQUEST)
+        order_ids = {int(order_id) for order_id in order_ids}
+
+        changes = {}
+        if data.get('status') is not None:
+            # Same convention as PATCH /api/orders/<id>: 0 is pending, 1 is delivered
+            if data['status'] not in (0, 1, '0', '1'):
+                return Response({"message": "status should be 0 or 1"}, status=status.HTTP_400_BAD_REQUEST)
+            changes['status'] = data['status'] in (1, '1')
+        if data.get('delivery_crew_id') is not None:
+            if not is_manager:
+                return Response({'message': "Only managers can assign orders"}, status=status.HTTP_403_FORBIDDEN)
+            if not is_id(data['delivery_crew_id']):
+                return Response({"message": "delivery_crew_id should be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            crew_id = int(data['delivery_crew_id'])
+            if not User.objects.filter(id=crew_id, groups__name='Delivery Crew').exists():
+                return Response({'message': "Delivery User Not Found"}, status=status.HTTP_404_NOT_FOUND)
+            changes['delivery_crew_id'] = crew_id
+        if not changes:
+            return Response({"message": "Send a status and/or a delivery_crew_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            orders = list(Order.objects.filter(id__in=order_ids)
+                          .values_list('id', 'user_id', 'delivery_crew_id', 'status', 'date'))
+            missing = sorted(order_ids - {order[0] for order in orders})
+            if missing:
+                return Response({'message': "Order Not Found", "order_ids": missing}, status=status.HTTP_404_NOT_FOUND)
+            if not is_manager:
+                forbidden = sorted(order[0] for order in orders if order[2] != request.user.pk)
+                if forbidden:
+                    return Response({'message': "You can't modify these orders", "order_ids": forbidden}, status=status.HTTP_403_FORBIDDEN)
+
+            crew_id = changes.get('delivery_crew_id')
+            delivered = changes.get('status')
+            events, delivered_deltas, updated = [], defaultdict(int), []
+            for order_id, user_id, previous_crew_id, was_delivered, order_date in orders:
+                new_crew_id = previous_crew_id if crew_id is None else crew_id
+                new_status = was_delivered if delivered is None else delivered
+                if new_crew_id != previous_crew_id:
+                    events.append(OrderEvent(order_id=order_id, kind=OrderEvent.ASSIGNED, user_id=user_id,
+                                             delivery_crew_id=new_crew_id, previous_delivery_crew_id=previous_crew_id,
+                                             status=new_status))
+                if new_status != was_delivered:
+                    events.append(OrderEvent(order_id=order_id, kind=OrderEvent.STATUS, user_id=user_id,
+                                             delivery_crew_id=new_crew_id, status=new_status))
+                    delivered_deltas[order_date] += 1 if new_status else -1
+                if (new_crew_id, new_status) != (previous_crew_id, was_delivered):
+                    updated.append(order_id)
+
+            if updated:
+                Order.objects.filter(id__in=updated).update(**changes)
+                record_order_events(events)
+                rollups.add_delivered(delivered_deltas)
+
+        return Response({
+            'message': "Orders updated",
+            'updated': len(updated),
+            'unchanged': len(orders) - len(updated),
+        }, status=status.HTTP_200_OK)
+
+
+# Class View listing the archived orders (see archive.py), with the same
+# visibility rules and keyset pagination as GET /api/orders/
+class OrderHistoryView(InstrumentedViewMixin, ReadOnlyViewMixin, APIView):
+    def get_permissions(self):
+        return [IsCustomerOrManagerOrDeliveryCrew()]
+
+    def get(self, request, *args, **kwargs):
+        roles = get_user_roles(request.user)
+        orders = ArchivedOrder.objects.all()
+        if "Customer" in roles:
+            orders = orders.filter(user=request.user)
+        elif "Manager" not in roles:
+            orders = orders.filter(delivery_crew=request.user)
+
+        paginator = OrderKeysetPagination()
+        page = paginator.paginate_queryset(archived_order_reader.values(orders), request, view=self)
+        return paginator.get_paginated_response(archived_order_reader.render(page))
+
+
+# Class View streaming the live and archived orders for accounting (see order_export.py,
+# which should not run while the orders are being archived)
+class OrderExportView(InstrumentedViewMixin, APIView):
+    def get_permissions(self):
+        return [IsManager()]
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('fmt', 'csv')
+        if fmt not in order_export.FORMATS:
+            return Response({"message": f"fmt should be one of {', '.join(order_export.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_from = date.fromisoformat(request.query_params['from']) if 'from' in request.query_params else None
+            date_to = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else None
+        except ValueError:
+            return Response({"message": "from and to should be YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST)
+        # Same convention as GET /api/orders/?status=: 0 is pending, 1 is delivered
+        status_value = request.query_params.get('status')
+        if status_value not in (None, '0', '1'):
+            return Response({"message": "status should be 0 or 1"}, status=status.HTTP_400_BAD_REQUEST)
+        delivered = None if status_value is None else status_value == '1'
+
+        # Under ASGI a sync iterator would be read whole before the first byte is sent
+        export = order_export.aexport_orders if isinstance(request._request, ASGIRequest) else order_export.export_orders
+        rows = export(fmt, date_from=date_from, date_to=date_to, delivered=delivered)
+        response = StreamingHttpResponse(rows, content_type=order_export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+        return response
+
+
+# Class View for the order change feed (see order_feed.py). It answers at once;
+# under ASGI async_views.OrderEventFeedView waits for events and streams them.
+class OrderEventView(InstrumentedViewMixin, ReadOnlyViewMixin, APIView):
+    throttle_classes = [SharedAnonRateThrottle, SharedScopedRateThrottle]
+    throttle_scope = 'order-feed'
+
+    def get_permissions(self):
+        return [IsCustomerOrManagerOrDeliveryCrew()]
+
+    def get(self, request, *args, **kwargs):
+        events, cursor = fetch_events(request.user, parse_since(request))
+        return Response({'events': events, 'cursor': cursor}, status=status.HTTP_200_OK)
+
+
+# Class View for the manager sales analytics. It only reads the rollups (see
+# rollups.py), so the cost depends on the requested range, not on the history.
+class SalesAnalyticsView(InstrumentedViewMixin, ReadOnlyViewMixin, APIView):
+    def get_permissions(self):
+        return [IsManager()]
+
+    def get(self, request, *args, **kwargs):
+        max_days = getattr(settings, 'ANALYTICS_MAX_DAYS', 366)
+        try:
+            end = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else date.today()
+            start = (date.fromisoformat(request.query_params['from']) if 'from' in request.query_params
+                     else end - timedelta(days=29))
+            top = min(int(request.query_params.get('top', 10)), 100)
+        except ValueError:
+            return Response({"error": "from and to should be YYYY-MM-DD dates and top an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if top < 1:
+            return Response({"error": "top should be at least 1"}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or (end - start).days >= max_days:
+            return Response({"error": f"from should be before to, at most {max_days} days apart"}, status=status.HTTP_400_BAD_REQUEST)
+
+        daily = list(DailySales.objects.filter(date__range=(start, end)).order_by('date')
+                     .values('date', 'orders', 'delivered', 'items', 'revenue'))
+        totals = {key: sum(row[key] for row in daily) for key in ('orders', 'delivered', 'items', 'revenue')}
+        top_menu_items = (MenuItemSales.objects.filter(date__range=(start, end))
+                          .values('menuitem_id', title=F('menuitem__title'))
+                          .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+                          .filter(quantity__gt=0).order_by('-quantity', 'menuitem_id')[:top])
+        top_categories = (CategorySales.objects.filter(date__range=(start, end))
+                          .values('category_id', title=F('category__title'))
+                          .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+                          .filter(quantity__gt=0).order_by('-quantity', 'category_id')[:top])
+        return Response({
+            'from': start,
+            'to': end,
+            'totals': totals,
+            'daily': daily,
+            'top_menu_items': list(top_menu_items),
+            'top_categories': list(top_categories),
+        }, status=status.HTTP_200_OK)
+
+
+# Class View exposing the request metrics to Prometheus (managers only)
+class MetricsView(APIView):
+    def get_permissions(self):
+        return [IsManager()]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_prometheus(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')